@@ -0,0 +1,276 @@
+""" Throughput and regression benchmarks for the summarizers and title features.
+
+Runs each target over synthetic documents of increasing length (and, optionally, a sample of
+the real corpus), recording docs/sec, p50/p99 latency, how much the target grew the process's
+RSS, and a hash of the outputs. Results are written to a JSON file; given a baseline file from
+an earlier run, targets whose throughput, p99 latency or memory got worse than the tolerance
+allows, or whose outputs changed, are reported.
+
+    python benchmark.py --out bench.json --baseline bench_baseline.json
+
+python benchmark.py --imports checks that the summarizer modules import in under 100 ms each.
+"""
+
+import sys
+import json
+import time
+import random
+import hashlib
+import subprocess
+
+import numpy as np
+
+from tracing import current_rss
+
+# filler vocabulary for synthetic documents; includes the words the title features look for
+words = ["the", "a", "police", "president", "city", "team", "you", "your", "best", "greatest",
+         "list", "top", "things", "10", "5", "said", "found", "new", "old", "people", "story",
+         "why", "how", "what", "will", "never", "believe", "this", "week", "report", "in", "on"]
+
+def synthetic_texts(num_docs, num_sents, seed = 0):
+    """ Generate random documents.
+
+    Args:
+        num_docs (int): number of documents
+        num_sents (int): number of sentences per document
+        seed (int): random seed, so every run benchmarks the same documents
+
+    Returns:
+        list of strings: the documents
+    """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(num_docs):
+        sents = []
+        for _ in range(num_sents):
+            sent = " ".join(rng.choice(words) for _ in range(rng.randint(4, 20)))
+            sents.append(sent[0].upper() + sent[1:] + rng.choice([".", ".", "?", "!"]))
+        texts.append(" ".join(sents))
+    return texts
+
+def rss_mb():
+    """ Current resident set size of this process, in megabytes.
+    """
+    return current_rss() / 2. ** 20
+
+def output_hash(outputs):
+    """ Stable fingerprint of a target's outputs, for detecting drift between runs.
+    """
+    def normalize(value):
+        if isinstance(value, (float, np.floating)):
+            return None if np.isnan(value) else round(float(value), 9)
+        if isinstance(value, (np.ndarray, list, tuple)):
+            return [normalize(v) for v in value]
+        if isinstance(value, dict):
+            return {str(k): normalize(v) for k, v in sorted(value.items())}
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+    return hashlib.sha1(json.dumps(normalize(list(outputs))).encode("utf-8")).hexdigest()
+
+def time_target(fn, inputs):
+    """ Run a target over its inputs one at a time.
+
+    Args:
+        fn (function): the target, called with each input
+        inputs (list): the inputs
+
+    Returns:
+        dict: docs/sec, p50 and p99 latency in milliseconds, RSS growth, and output hash. RSS growth
+            is the largest increase over the RSS before the first call, sampled after each call, so
+            it's the target's own footprint rather than the process's peak so far (which only rises)
+    """
+    outputs = []
+    latencies = []
+    rss_before = rss_mb()
+    rss_peak = rss_before
+    start = time.perf_counter()
+    for item in inputs:
+        item_start = time.perf_counter()
+        outputs.append(fn(item))
+        latencies.append(time.perf_counter() - item_start)
+        rss_peak = max(rss_peak, rss_mb())
+    total = time.perf_counter() - start
+    return {'docs': len(inputs),
+            'docs_per_sec': len(inputs) / total if total > 0 else float('inf'),
+            'p50_ms': float(np.percentile(latencies, 50)) * 1000,
+            'p99_ms': float(np.percentile(latencies, 99)) * 1000,
+            'rss_growth_mb': rss_peak - rss_before,
+            'output_hash': output_hash(outputs)}
+
+def targets(docs, vad_path = "Data/vad.csv"):
+    """ The functions under benchmark, each taking one parsed document.
+
+    Args:
+        docs (list of spacy.tokens.doc.Doc): the documents, also used as the tfidf background corpus
+        vad_path (string): path to the VAD lexicon csv
+
+    Returns:
+        dict: target name -> function of one document
+    """
+    import textrank
+    from sumbasic import sumbasic
+    from tfidf_model import TfidfModel
+    from tfidf_summarizer import get_tfidf_matrix, tfidf_summarizer
+    from match_title_ents import match_title_ents
+    from listicles import is_listicle
+    from vad import VadLexicon
+    from features import extract
+    import dimensions # registers the title dimensions with the feature engine
+
+    tfidf = TfidfModel().partial_fit(docs)
+    # the background matrix is built once, as the corpus scripts do, so only summarizing is timed
+    idx, matrix = get_tfidf_matrix(docs)
+    rows = {id(doc): row for row, doc in enumerate(docs)}
+    lexicon = VadLexicon.from_csv(vad_path)
+    dims = ['listicle', 'leadsWithQuestion', 'hasDeterminer', 'numNamedEntities', 'superlative', 'accusatory']
+    return {
+        'textrank': lambda doc: textrank.summarize(doc, 3),
+        'sumbasic': lambda doc: sumbasic(doc, 3),
+        'tfidf': lambda doc: tfidf.summarize(doc, 3),
+        'tfidf_summarizer': lambda doc: tfidf_summarizer(doc, rows[id(doc)], idx, matrix, 3),
+        # first sentence stands in for the title
+        'match_title_ents': lambda doc: match_title_ents(next(doc.sents).as_doc(), doc),
+        'is_listicle': is_listicle,
+        'get_vad': lambda doc: lexicon.score([doc])[0],
+        'dimensions': lambda doc: [values[0] for values in extract([doc], dims).values()],
+    }
+
+def run(nlp, num_docs = 100, sizes = (1, 10, 100), corpus = None, vad_path = "Data/vad.csv"):
+    """ Benchmark every target on synthetic documents of each size, and on a corpus sample if given.
+
+    Args:
+        nlp (spacy.language.Language): model to parse the documents with
+        num_docs (int): number of documents per corpus
+        sizes (list of ints): sentences per synthetic document
+        corpus (list of strings): real documents to sample num_docs from (optional)
+        vad_path (string): path to the VAD lexicon csv
+
+    Returns:
+        dict: "target/corpus" -> measurements from time_target
+    """
+    corpora = [("synthetic-{}".format(size), synthetic_texts(num_docs, size)) for size in sizes]
+    if corpus:
+        corpora.append(("sample", random.Random(0).sample(list(corpus), min(num_docs, len(corpus)))))
+    results = {}
+    for corpus_name, texts in corpora:
+        docs = list(nlp.pipe(texts))
+        for name, fn in targets(docs, vad_path).items():
+            results["{}/{}".format(name, corpus_name)] = time_target(fn, docs)
+    return results
+
+def compare(results, baseline, tolerance = 0.2, rss_slack_mb = 16.):
+    """ Find regressions against a baseline run.
+
+    Args:
+        results (dict): output of run
+        baseline (dict): output of an earlier run
+        tolerance (float): allowed fractional drop in docs/sec, and fractional rise in p99 latency and RSS growth
+        rss_slack_mb (float): RSS growth always allowed on top of the tolerance, since small
+            measurements are mostly allocator noise
+
+    Returns:
+        list of strings: a description of each regression or output change
+    """
+    problems = []
+    for key, now in sorted(results.items()):
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if now['docs_per_sec'] < (1. - tolerance) * before['docs_per_sec']:
+            problems.append("{}: {:.1f} docs/sec, was {:.1f}".format(key, now['docs_per_sec'], before['docs_per_sec']))
+        if now['p99_ms'] > (1. + tolerance) * before['p99_ms']:
+            problems.append("{}: p99 {:.2f} ms, was {:.2f}".format(key, now['p99_ms'], before['p99_ms']))
+        # baselines from before RSS growth was recorded don't have it
+        if 'rss_growth_mb' in before and now['rss_growth_mb'] > (1. + tolerance) * before['rss_growth_mb'] + rss_slack_mb:
+            problems.append("{}: RSS grew {:.1f} MB, was {:.1f}".format(key, now['rss_growth_mb'], before['rss_growth_mb']))
+        if now['output_hash'] != before['output_hash']:
+            problems.append("{}: output changed".format(key))
+    return problems
+
+# modules that should be cheap to import, and the budget for each
+summarizer_modules = ["textrank", "sumbasic", "tfidf_summarizer", "tfidf_model"]
+import_budget_ms = 100.
+
+def import_time_ms(module):
+    """ Cumulative time to import a module in a fresh interpreter, from python -X importtime.
+
+    Args:
+        module (string): module name
+
+    Returns:
+        float: milliseconds spent importing the module and everything it imports
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                          stderr = subprocess.PIPE, universal_newlines = True, check = True)
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"; nested imports are indented
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].rstrip() == " " + module:
+            return int(fields[1]) / 1000.
+    raise ValueError("No import time reported for {}".format(module))
+
+def check_imports(modules = summarizer_modules, budget_ms = import_budget_ms, repeat = 3):
+    """ Import each module in a fresh interpreter and compare against the startup budget.
+
+    Args:
+        modules (list of strings): module names
+        budget_ms (float): allowed milliseconds per module
+        repeat (int): number of fresh imports to take the fastest of
+
+    Returns:
+        dict: module -> import time in milliseconds
+        list of strings: a description of each module over budget
+    """
+    times = {module: min(import_time_ms(module) for _ in range(repeat)) for module in modules}
+    problems = ["{}: imports in {:.1f} ms, budget {:.0f} ms".format(module, ms, budget_ms)
+                for module, ms in sorted(times.items()) if ms > budget_ms]
+    return times, problems
+
+def main():
+    import argparse
+    from parsing import load_model
+
+    parser = argparse.ArgumentParser(description = "Benchmark the summarizers and title features.")
+    parser.add_argument("--model", default = "en_core_web_lg")
+    parser.add_argument("--docs", type = int, default = 100, help = "documents per corpus (up to 10000)")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1, 10, 100], help = "sentences per synthetic document")
+    parser.add_argument("--corpus", help = "cleaned corpus directory to sample real articles from")
+    parser.add_argument("--out", default = "bench.json")
+    parser.add_argument("--baseline", help = "results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type = float, default = 0.2)
+    parser.add_argument("--imports", action = "store_true", help = "only check the summarizer import times")
+    args = parser.parse_args()
+
+    if args.imports:
+        times, problems = check_imports()
+        for module, ms in sorted(times.items()):
+            print("{:40s} {:10.1f} ms".format(module, ms))
+        for problem in problems:
+            print("REGRESSION", problem)
+        if problems:
+            raise SystemExit(1)
+        return
+
+    corpus = None
+    if args.corpus:
+        from loader import read_corpus
+        corpus = read_corpus(args.corpus, columns = ['targetParagraphs'])['targetParagraphs'].tolist()
+
+    results = run(load_model(args.model), args.docs, args.sizes, corpus)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent = 2, sort_keys = True)
+    for key, r in sorted(results.items()):
+        print("{:40s} {:10.1f} docs/s  p50 {:8.2f} ms  p99 {:8.2f} ms  RSS +{:7.1f} MB".format(
+            key, r['docs_per_sec'], r['p50_ms'], r['p99_ms'], r['rss_growth_mb']))
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print("REGRESSION", problem)
+        if problems:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
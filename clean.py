@@ -1,33 +1,18 @@
 """ Read in clickbait corpus data, combine with truth labels, clean up text. 
 """
 
-import jsonlines as jl
-import pandas as pd
-
-with jl.open('Data/instances.jsonl') as reader:
-    df = pd.DataFrame()
-    for obj in reader:
-        df = df.append(obj, ignore_index = True)
-
-df = df.set_index('id')
-col_labels = ['truthJudgments', 'truthMean', 'truthMedian', 'truthMode', 'truthClass']
-for label in col_labels:
-    df[label] = None
-
-with jl.open('Data/truth.jsonl') as reader:
-    for obj in reader:
-        row_label = str(obj['id'])
-        for label in col_labels:
-            df.at[row_label, label] = obj[label]
-
 # The clickbait corpus is German in origin, so some unicode irregularities need to be taken care of
 
 import unicodedata
 import re
 
+# compiled once at import, so once per worker process when cleaning in parallel
+spaces = re.compile(' +')
+final_punct = re.compile("[\.\?!\"'’”]$") # sentence-final punctuation
+
 def unicode_normalize(string):
     text = unicodedata.normalize("NFKD", string.replace("\xad", "")) # normalize unicode
-    text = re.sub(' +', ' ', text) # strip out any excess spaces
+    text = spaces.sub(' ', text) # strip out any excess spaces
     return text
 
 def clean_postText(post):
@@ -52,8 +37,7 @@ def strip_endmatter(paragraphs):
         list of strings: the article with endmatter removed
     """
     # the intuition is that content-less endmatter won't be properly punctuated most of the time
-    regex = re.compile("[\.\?!\"'’”]$") # sentence-final punctuation
-    open_ended = [bool(regex.findall(p)) for p in paragraphs]
+    open_ended = [bool(final_punct.findall(p)) for p in paragraphs]
     # somehow, there are articles that don't have a single punctuated paragraph
     if any(open_ended):
         open_ended.reverse()
@@ -65,11 +49,6 @@ def clean_paragraphs(ps):
     stripped = strip_endmatter(normalized) # remove useless endmatter
     return "\n".join(stripped) # paragraphs are given as lists of strings, so join them with newline character
 
-df['postText'] = df['postText'].apply(clean_postText)
-df['targetKeywords'] = df['targetKeywords'].apply(clean_keywords)
-df['targetParagraphs'] = df['targetParagraphs'].apply(clean_paragraphs)
-df['targetTitle'] = df['targetTitle'].apply(unicode_normalize)
-
 # many article titles end with a reference to the sitename "The list" 
 # fortunately, consistent formatting makes it easy to get rid of these
 
@@ -79,10 +58,31 @@ def strip_the_list(title):
             return title[:-8].strip()
     return title
 
-df['targetTitle'] = df['targetTitle'].apply(strip_the_list)
-
-# dump the cleaned corpus as a pickled file for easy access later
+def clean_instance(obj):
+    """ Clean the text fields of a single corpus instance.
 
-import pickle
+    Args:
+        obj (dict): one line of instances.jsonl
 
-pickle.dump(df, open("clickbait.p", "wb"))
\ No newline at end of file
+    Returns:
+        dict: the same instance with postText, targetKeywords, targetParagraphs and targetTitle cleaned
+    """
+    obj = dict(obj)
+    obj['postText'] = clean_postText(obj['postText'])
+    obj['targetKeywords'] = clean_keywords(obj['targetKeywords'])
+    obj['targetParagraphs'] = clean_paragraphs(obj['targetParagraphs'])
+    obj['targetTitle'] = strip_the_list(unicode_normalize(obj['targetTitle']))
+    return obj
+
+def main():
+    # dump the cleaned corpus as chunked parquet files for easy access later
+    import os
+    from loader import write_corpus
+    from dedup import NearDuplicateIndex
+    # cluster near-identical article bodies (syndicated stories, reposts) so later stages process each once
+    dedup = NearDuplicateIndex(threshold = 0.8)
+    write_corpus('Data/instances.jsonl', 'Data/truth.jsonl', 'Data/clickbait.parquet', workers = os.cpu_count(), dedup = dedup)
+    print("near-duplicate articles:", dedup.report())
+
+if __name__ == "__main__":
+    main()
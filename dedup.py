@@ -0,0 +1,159 @@
+""" Near-duplicate article detection with MinHash and locality-sensitive hashing.
+
+Syndicated wire stories and reposts show up many times in the corpus with the same or nearly
+the same body text. Each article body is reduced to a MinHash signature of its word shingles;
+signatures are split into bands, and articles sharing a band bucket are compared by the fraction
+of matching signature values (an estimate of the Jaccard similarity of their shingle sets).
+Articles above the threshold join the cluster of the earlier article they match, so cluster
+representatives are always the first copy seen and assignments never change as the stream goes
+on. Later stages can then parse and summarize each cluster once: doc_cache.main parses only the
+representatives and aliases the other members to them, and textrank.main summarizes through
+per_cluster.
+"""
+
+import re
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+prime = 4294967291 # largest prime below 2**32; a * x + b stays below 2**64 for 32-bit a, b, x
+words = re.compile(r"\w+")
+
+def shingles(text, k = 5):
+    """ Hash the overlapping k-word windows of a text.
+
+    Args:
+        text (string): the text
+        k (int): words per shingle
+
+    Returns:
+        numpy.array: distinct 32-bit shingle hashes; texts shorter than k words are one shingle
+    """
+    tokens = words.findall(text.lower())
+    grams = [" ".join(tokens[i:i + k]) for i in range(max(len(tokens) - k + 1, 1))]
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype = np.uint64, count = len(grams)))
+
+def lsh_params(threshold, num_perm):
+    """ Pick the banding whose LSH threshold, (1 / bands) ** (1 / rows), is the highest one at or below
+    the similarity threshold: pairs near the threshold still become candidates, and candidates are
+    checked against the threshold anyway.
+
+    Args:
+        threshold (float): Jaccard similarity threshold
+        num_perm (int): signature length
+
+    Returns:
+        int: number of bands
+        int: rows per band
+    """
+    options = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    below = [option for option in options if (1. / option[0]) ** (1. / option[1]) <= threshold]
+    return max(below or options[-1:], key = lambda option: (1. / option[0]) ** (1. / option[1]))
+
+class NearDuplicateIndex(object):
+    """ Streaming MinHash/LSH index that assigns each added text to a cluster.
+
+    Args:
+        threshold (float): estimated Jaccard similarity above which two texts are near-duplicates
+        num_perm (int): MinHash signature length; longer is more accurate and slower
+        k (int): words per shingle
+        seed (int): seed for the hash functions, so clusters are reproducible
+    """
+
+    def __init__(self, threshold = 0.8, num_perm = 128, k = 5, seed = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.k = k
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, prime, size = num_perm).astype(np.uint64)[:, None]
+        self.b = rng.randint(0, prime, size = num_perm).astype(np.uint64)[:, None]
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.buckets = [{} for _ in range(self.bands)] # band -> {band bytes: ids}
+        self.signatures = {} # id -> signature
+        self.representative = OrderedDict() # id -> id of the first article in its cluster
+
+    def signature(self, text):
+        """ MinHash signature of a text.
+
+        Args:
+            text (string): the text
+
+        Returns:
+            numpy.array: shape (num_perm,), the minimum of each hash function over the text's shingles
+        """
+        return ((self.a * shingles(text, self.k) + self.b) % prime).min(axis = 1)
+
+    def add(self, id, text):
+        """ Add a text and find its cluster.
+
+        Args:
+            id (string): corpus id
+            text (string): the text, e.g. the cleaned targetParagraphs
+
+        Returns:
+            string: id of the cluster's representative (id itself if the text is new)
+        """
+        signature = self.signature(text)
+        bands = [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+        rep = id
+        seen = set()
+        for buckets, band in zip(self.buckets, bands):
+            for other in buckets.get(band, ()):
+                if other in seen:
+                    continue
+                seen.add(other)
+                if np.mean(self.signatures[other] == signature) >= self.threshold:
+                    rep = self.representative[other]
+                    break
+            if rep != id:
+                break
+        for buckets, band in zip(self.buckets, bands):
+            buckets.setdefault(band, []).append(id)
+        self.signatures[id] = signature
+        self.representative[id] = rep
+        return rep
+
+    def clusters(self):
+        """ Group the added ids by cluster.
+
+        Returns:
+            OrderedDict: representative id -> ids in the cluster, in the order they were added
+        """
+        groups = OrderedDict()
+        for id, rep in self.representative.items():
+            groups.setdefault(rep, []).append(id)
+        return groups
+
+    def report(self):
+        """ Summarize how much work clustering saves.
+
+        Returns:
+            dict: number of texts, clusters and duplicates, and the fraction of texts that won't
+                need processing
+        """
+        docs = len(self.representative)
+        clusters = sum(1 for id, rep in self.representative.items() if id == rep)
+        return {'docs': docs, 'clusters': clusters, 'duplicates': docs - clusters,
+                'saved_fraction': (docs - clusters) / docs if docs else 0.}
+
+def per_cluster(fn, items, representative):
+    """ Run a batch computation once per cluster and fan the results out to every member.
+
+    Args:
+        fn (function): takes a list of inputs and returns a list of results in the same order
+        items (iterable of tuples): (id, input) pairs; only the representatives' inputs are used
+        representative (dict-like): id -> representative id, e.g. NearDuplicateIndex.representative
+            or a data frame's clusterId column; an id whose representative isn't among the items
+            is computed itself
+
+    Returns:
+        OrderedDict: id -> result, for every id in items
+    """
+    items = list(items)
+    present = set(id for id, _ in items)
+    rep_of = {id: representative[id] if representative[id] in present else id for id, _ in items}
+    needed = set(rep_of.values())
+    reps = OrderedDict((id, value) for id, value in items if id in needed)
+    results = dict(zip(reps, fn(list(reps.values()))))
+    return OrderedDict((id, results[rep_of[id]]) for id, _ in items)
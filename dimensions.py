@@ -1,11 +1,10 @@
+import os
 import re
-import spacy
-import pickle
-import pandas as pd
 from listicles import is_listicle
-from textblob import TextBlob
-from pattern.en import parse, Sentence, parse
-from pattern.en import modality
+from features import doc_feature, token_feature, extract
+from modality_stage import run_modality
+from tracing import stage
+from stats import RunningStats
 
 # Word Lists
 you_forms = ["you", "your", "yours"]
@@ -13,29 +12,41 @@ question_words = ["who", "what", "where", "when", "why", "how"]
 flag_words = ["police", "dead", "shot", "killed", "injured"] # these are words that tend to throw off the listicle identifier
 irr_superlatives = ["best", "worst", "furthest", "farthest", "least", "most"]
 
+pipeline_needs = {"lemma", "pos", "sents", "noun_chunks", "ents", "is_digit", "is_punct"} # annotations read, see parsing.Parser
+
 # Dimension Measure Functions
+doc_feature("listicle")(is_listicle)
+
+@doc_feature("leadsWithQuestion")
 def leads_with_question(doc):
     """ Indicates whether a title leads with a question word.
     """
     return doc[0].text.lower() in question_words
 
+@doc_feature("hasDeterminer")
 def has_det(doc):
     """ Indicates whether any noun phrases in the title contain a determiner.
     """
     return any([tok.pos_ == "DET" for chunk in doc.noun_chunks for tok in chunk])
 
-def accusatory(doc):
-    """ Indicates whether the title refers directly to the reader.
+@doc_feature("numNamedEntities", dtype = int)
+def num_named_entities(doc):
+    """ Counts the named entities in a title.
     """
-    return any([tok.text.lower() in you_forms for tok in doc])
+    return len(doc.ents)
 
-def pattern_parse(text):
-    """ Parses a text into a pattern Sentence object.
+@token_feature("accusatory")
+def is_you_form(tok):
+    """ Indicates whether a token addresses the reader.
+    """
+    return tok.text.lower() in you_forms
+
+def accusatory(doc):
+    """ Indicates whether the title refers directly to the reader.
     """
-    s = parse(text, lemmata = True)
-    s = Sentence(s)
-    return s
+    return any([is_you_form(tok) for tok in doc])
 
+@token_feature("superlative")
 def is_superlative(tok):
     """ Indicates whether a token is a superlative.
     """
@@ -51,33 +62,56 @@ def has_superlative(doc):
     """
     return any([is_superlative(tok) for tok in doc])
 
-# Data load
-df = pickle.load(open("clickbait.p", "rb"))
-docs = pickle.load(open("title_docs.p", "rb"))
-df = df.merge(docs, left_index = True, right_index = True)
-
-# Run analysis
-df['polarity'] = df['titleBlob'].apply(lambda blob: blob.sentiment.polarity)
-df['subjectivity'] = df['titleBlob'].apply(lambda blob: blob.sentiment.subjectivity)
-df['pattern'] = df['targetTitle'].apply(pattern_parse) # THIS WILL SOMETIMES FAIL FOR NO REASON. If you keep re-running it, it eventually works.
-df['modality'] = df['pattern'].apply(lambda s: modality(s))
-df['listicle'] = df['titleDoc'].apply(is_listicle)
-df['leadsWithQuestion'] = df['titleDoc'].apply(leads_with_question)
-df['hasDeterminer'] = df['titleDoc'].apply(has_det)
-df['numNamedEntities'] = df['titleDoc'].apply(lambda doc: len(doc.ents))
-df['superlative'] = df['titleDoc'].apply(has_superlative)
-df['accusatory'] = df['titleDoc'].apply(accusatory)
-
-# Data export
-stats = df[['truthMean', 'truthMedian', 'truthMode', 'truthClass', 
-            'polarity', 'subjectivity', 'modality', 'listicle', 
-            'leadsWithQuestion', 'hasDeterminer', 'numNamedEntities', 'superlative', 
-            'accusatory']].copy()
-
-stats['listicle'] = stats['listicle'].astype('int')
-stats['leadsWithQuestion'] = stats['leadsWithQuestion'].astype('int')
-stats['hasDeterminer'] = stats['hasDeterminer'].astype('int')
-stats['superlative'] = stats['superlative'].astype('int')
-stats['accusatory'] = stats['accusatory'].astype('int')
-
-stats.to_csv("dim_stats.csv")
\ No newline at end of file
+def main():
+    from loader import read_corpus
+    from doc_cache import DocCache
+    from parsing import load_model
+    from textblob import TextBlob
+
+    nlp = load_model('en_core_web_lg')
+
+    # Data load
+    with stage("dimensions.load") as s:
+        df = read_corpus("Data/clickbait.parquet")
+        s.items = len(df)
+    with stage("dimensions.parse", items = len(df)):
+        titles = DocCache("Data/doc_cache/titles", nlp)
+        titles.parse(zip(df.index, df['targetTitle'])) # only parses titles not already in the cache
+        df['titleDoc'] = titles.get_many(df.index)
+
+    # Run analysis
+    with stage("dimensions.textblob", items = len(df)):
+        sentiments = [TextBlob(title).sentiment for title in df['targetTitle']]
+        df['polarity'] = [sentiment.polarity for sentiment in sentiments]
+        df['subjectivity'] = [sentiment.subjectivity for sentiment in sentiments]
+    # pattern's parser sometimes fails for no reason, so this is checkpointed and retried; see modality_stage
+    with stage("dimensions.modality", items = len(df)):
+        df['modality'] = df.index.map(run_modality(zip(df.index, df['targetTitle']), "modality.sqlite", workers = os.cpu_count()))
+    # all the spaCy-based dimensions in one pass over each title
+    with stage("dimensions.spacy_features", items = len(df)):
+        for name, values in extract(df['titleDoc'], workers = os.cpu_count()).items():
+            df[name] = values
+
+    # Data export
+    stats = df[['truthMean', 'truthMedian', 'truthMode', 'truthClass', 
+                'polarity', 'subjectivity', 'modality', 'listicle', 
+                'leadsWithQuestion', 'hasDeterminer', 'numNamedEntities', 'superlative', 
+                'accusatory']].copy()
+
+    stats['listicle'] = stats['listicle'].astype('int')
+    stats['leadsWithQuestion'] = stats['leadsWithQuestion'].astype('int')
+    stats['hasDeterminer'] = stats['hasDeterminer'].astype('int')
+    stats['superlative'] = stats['superlative'].astype('int')
+    stats['accusatory'] = stats['accusatory'].astype('int')
+
+    stats.to_csv("dim_stats.csv") # still read by dim_stats.R for the plots
+    stats.to_parquet("Results/dim_features.parquet") # for folding into saved statistics later, see stats.main
+
+    # per-class means and correlations with the truth labels, straight from the frame (see stats)
+    with stage("dimensions.stats", items = len(stats)):
+        summary = RunningStats().update(stats)
+        summary.means().to_csv("Results/dim_means.csv")
+        summary.correlations().to_csv("Results/dim_correlations.csv", index = False)
+
+if __name__ == "__main__":
+    main()
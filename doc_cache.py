@@ -0,0 +1,236 @@
+""" Persistent cache of parsed spaCy documents.
+
+Parsed documents are stored in DocBin shards on disk. Each entry is keyed by a hash of
+the text and the model that parsed it (including which of its pipeline components ran),
+so re-running a pipeline only parses texts it hasn't seen before, and switching models
+or pruning the pipeline (see parsing.Parser) never serves stale or partial parses. Documents can be
+looked up by corpus id without loading the rest of the cache.
+"""
+
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+# LEMMA and POS aren't stored by DocBin by default in older spaCy versions;
+# SENT_START keeps the boundaries of documents split by a senter rather than the parser
+attrs = ["ORTH", "TAG", "HEAD", "DEP", "ENT_IOB", "ENT_TYPE", "LEMMA", "POS", "SENT_START"]
+
+def model_key(nlp):
+    """ Identify the model that produced a parse.
+
+    Args:
+        nlp (spacy.language.Language or parsing.Parser): a loaded spaCy model, or a Parser running part of one
+
+    Returns:
+        string: the model's language, name and version, and the pipeline components that ran
+    """
+    pipes = getattr(nlp, 'pipes', None)
+    if pipes is None:
+        pipes = nlp.pipe_names
+    return "{}_{}-{}:{}".format(nlp.meta.get('lang'), nlp.meta.get('name'), nlp.meta.get('version'), "+".join(pipes))
+
+def text_key(text, model):
+    """ Cache key for a text parsed by a particular model.
+
+    Args:
+        text (string): the text to be parsed
+        model (string): output of model_key
+
+    Returns:
+        string: hex digest identifying the (text, model) pair
+    """
+    return hashlib.sha1((model + "\x00" + text).encode("utf-8")).hexdigest()
+
+def docs_to_bytes(docs):
+    """ Serialize a batch of documents without their vocab, e.g. to send to a worker process.
+
+    Args:
+        docs (iterable of spacy.tokens.doc.Doc): the documents
+
+    Returns:
+        bytes: the serialized documents
+    """
+    from spacy.tokens import DocBin
+    docbin = DocBin(attrs = attrs)
+    for doc in docs:
+        docbin.add(doc)
+    return docbin.to_bytes()
+
+def docs_from_bytes(data, vocab):
+    """ Inverse of docs_to_bytes.
+
+    Args:
+        data (bytes): output of docs_to_bytes
+        vocab (spacy.vocab.Vocab): vocab to attach the documents to
+
+    Returns:
+        list of spacy.tokens.doc.Doc: the documents, in the order they were serialized
+    """
+    from spacy.tokens import DocBin
+    return list(DocBin().from_bytes(data).get_docs(vocab))
+
+class DocCache(object):
+    """ DocBin-backed store of parsed documents, addressable by corpus id.
+
+    Args:
+        path (string): directory holding the shards and index
+        nlp (spacy.language.Language or parsing.Parser): the model used to parse missing texts
+        shard_size (int): number of documents per shard file
+        max_shards (int): number of shards to keep deserialized in memory
+    """
+
+    def __init__(self, path, nlp, shard_size = 5000, max_shards = 4):
+        self.path = path
+        self.nlp = nlp
+        self.model = model_key(nlp)
+        self.shard_size = shard_size
+        self.max_shards = max_shards
+        self.keys = {} # text key -> [shard number, position in shard]
+        self.ids = {} # corpus id -> text key
+        self.num_shards = 0
+        self.pending = OrderedDict() # text key -> doc, not yet written to a shard
+        self.loaded = OrderedDict() # shard number -> list of docs, least recently used first
+        os.makedirs(path, exist_ok = True)
+        if os.path.exists(self._index_path()):
+            with open(self._index_path(), "r") as f:
+                index = json.load(f)
+            self.keys = index['keys']
+            self.ids = index['ids']
+            self.num_shards = index['num_shards']
+
+    def _index_path(self):
+        return os.path.join(self.path, "index.json")
+
+    def _shard_path(self, shard):
+        return os.path.join(self.path, "shard-{:05d}.spacy".format(shard))
+
+    def __contains__(self, id):
+        return id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _load_shard(self, shard):
+        if shard in self.loaded:
+            self.loaded.move_to_end(shard)
+            return self.loaded[shard]
+        with open(self._shard_path(shard), "rb") as f:
+            docs = docs_from_bytes(f.read(), self.nlp.vocab)
+        self.loaded[shard] = docs
+        if len(self.loaded) > self.max_shards:
+            self.loaded.popitem(last = False)
+        return docs
+
+    def get(self, id):
+        """ Look up the parsed document for a corpus id.
+
+        Args:
+            id (string): corpus id
+
+        Returns:
+            spacy.tokens.doc.Doc: the parsed document
+        """
+        key = self.ids[id]
+        if key not in self.keys:
+            # added since the last flush
+            return self.pending[key]
+        shard, pos = self.keys[key]
+        return self._load_shard(shard)[pos]
+
+    def get_many(self, ids):
+        """ Look up the parsed documents for several corpus ids.
+
+        Args:
+            ids (iterable of strings): corpus ids
+
+        Returns:
+            list of spacy.tokens.doc.Doc: the parsed documents, in the order of ids
+        """
+        return [self.get(id) for id in ids]
+
+    def add(self, id, doc):
+        """ Add an already parsed document to the cache.
+
+        Args:
+            id (string): corpus id
+            doc (spacy.tokens.doc.Doc): the parsed document
+        """
+        key = text_key(doc.text, self.model)
+        self.ids[id] = key
+        if key not in self.keys and key not in self.pending:
+            self.pending[key] = doc
+            if len(self.pending) >= self.shard_size:
+                self.flush()
+
+    def alias(self, id, other):
+        """ Make a corpus id refer to another id's document, e.g. a near-duplicate article's
+        cluster representative, without parsing it.
+
+        Args:
+            id (string): corpus id to add
+            other (string): corpus id already in the cache
+        """
+        self.ids[id] = self.ids[other]
+
+    def parse(self, items, batch_size = 256):
+        """ Parse and cache the texts that aren't cached yet. Texts already parsed by
+        the same model (under any id) are reused rather than parsed again.
+
+        Args:
+            items (iterable of tuples): (id, text) pairs
+            batch_size (int): batch size for nlp.pipe
+
+        Returns:
+            int: number of texts that had to be parsed
+        """
+        todo = OrderedDict() # text key -> (text, list of ids)
+        for id, text in items:
+            key = text_key(text, self.model)
+            if key in self.keys or key in self.pending:
+                self.ids[id] = key
+            elif key in todo:
+                todo[key][1].append(id)
+            else:
+                todo[key] = (text, [id])
+        texts = (text for text, _ in todo.values())
+        for (text, ids), doc in zip(todo.values(), self.nlp.pipe(texts, batch_size = batch_size)):
+            for id in ids:
+                self.add(id, doc)
+        self.flush()
+        return len(todo)
+
+    def flush(self):
+        """ Write pending documents to a new shard and save the index.
+        """
+        if self.pending:
+            shard = self.num_shards
+            with open(self._shard_path(shard), "wb") as f:
+                f.write(docs_to_bytes(self.pending.values()))
+            for pos, key in enumerate(self.pending):
+                self.keys[key] = [shard, pos]
+            self.num_shards += 1
+            self.pending = OrderedDict()
+        with open(self._index_path(), "w") as f:
+            json.dump({'keys': self.keys, 'ids': self.ids, 'num_shards': self.num_shards}, f)
+
+def main():
+    # parse the cleaned corpus into Data/doc_cache, skipping anything parsed on a previous run
+    from loader import read_clusters
+    from parsing import load_model
+
+    nlp = load_model('en_core_web_lg')
+    df = read_clusters("Data/clickbait.parquet", ['targetTitle', 'targetParagraphs']) # written by clean.main
+    titles = DocCache("Data/doc_cache/titles", nlp)
+    print("titles parsed:", titles.parse(zip(df.index, df['targetTitle'])))
+    # near-duplicate articles (see dedup) share their cluster representative's parse
+    reps = df[df.index == df['clusterId']]
+    articles = DocCache("Data/doc_cache/articles", nlp)
+    print("articles parsed:", articles.parse(zip(reps.index, reps['targetParagraphs'])))
+    for id, rep in df.loc[df.index != df['clusterId'], 'clusterId'].items():
+        articles.alias(id, rep)
+    articles.flush()
+    print("near-duplicate articles not parsed:", len(df) - len(reps))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+""" Registry-based feature extraction over spaCy documents.
+
+Features register a kernel with doc_feature (called once per document) or token_feature
+(called per token, true if any token matches). extract evaluates every requested token
+kernel in a single pass over each document's tokens, so adding a feature doesn't add
+another pass over the corpus, and returns one numpy array per feature.
+"""
+
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+Feature = namedtuple("Feature", ['name', 'kind', 'kernel', 'dtype'])
+
+registry = OrderedDict() # feature name -> Feature, in order of registration
+
+def doc_feature(name, dtype = bool):
+    """ Decorator registering a function of a whole document as a feature.
+
+    Args:
+        name (string): feature (column) name
+        dtype (numpy.dtype): type of the feature's values
+    """
+    def register(kernel):
+        registry[name] = Feature(name, 'doc', kernel, dtype)
+        return kernel
+    return register
+
+def token_feature(name):
+    """ Decorator registering a function of a single token as a boolean feature,
+    which is true for a document if the function is true for any of its tokens.
+
+    Args:
+        name (string): feature (column) name
+    """
+    def register(kernel):
+        registry[name] = Feature(name, 'token', kernel, bool)
+        return kernel
+    return register
+
+def extract_doc(doc, features):
+    """ Evaluate features on one document, walking its tokens once.
+
+    Args:
+        doc (spacy.tokens.doc.Doc): a spaCy document
+        features (list of Feature): the features to evaluate
+
+    Returns:
+        list: the value of each feature, in order
+    """
+    values = [False if f.kind == 'token' else f.kernel(doc) for f in features]
+    pending = [i for i, f in enumerate(features) if f.kind == 'token']
+    for tok in doc:
+        if not pending: # every token feature has already matched
+            break
+        unmatched = []
+        for i in pending:
+            if features[i].kernel(tok):
+                values[i] = True
+            else:
+                unmatched.append(i)
+        pending = unmatched
+    return values
+
+def _extract_chunk(docs, features):
+    return [extract_doc(doc, features) for doc in docs]
+
+worker_vocab = None
+
+def _init_worker(lang):
+    global worker_vocab
+    from parsing import blank_vocab
+    worker_vocab = blank_vocab(lang)
+
+def _extract_serialized(args):
+    from doc_cache import docs_from_bytes
+    data, features = args
+    return _extract_chunk(docs_from_bytes(data, worker_vocab), features)
+
+def _chunks(docs, chunksize):
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def extract(docs, names = None, workers = 1, chunksize = 256, lang = 'en'):
+    """ Extract features from a stream of documents.
+
+    Args:
+        docs (iterable of spacy.tokens.doc.Doc): the documents
+        names (list of strings): features to extract (default all registered features)
+        workers (int): number of worker processes; 1 extracts in this process
+        chunksize (int): number of documents sent to a worker at a time
+        lang (string): language of the documents, used to rebuild them in worker processes
+
+    Returns:
+        OrderedDict: feature name -> numpy array with one value per document, in input order
+    """
+    features = [registry[name] for name in (names or list(registry))]
+    if workers <= 1:
+        rows = (row for chunk in _chunks(docs, chunksize) for row in _extract_chunk(chunk, features))
+    else:
+        from parallel import ordered_map
+        from doc_cache import docs_to_bytes
+        # documents are sent without their vocab; workers attach them to a blank vocab for the language
+        tasks = ((docs_to_bytes(chunk), features) for chunk in _chunks(docs, chunksize))
+        rows = (row for chunk in ordered_map(_extract_serialized, tasks, workers, initializer = _init_worker, initargs = (lang,))
+                for row in chunk)
+    columns = [[] for _ in features]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+    return OrderedDict((f.name, np.array(column, dtype = f.dtype)) for f, column in zip(features, columns))
@@ -1,3 +1,12 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from tracing import traced
+
+pipeline_needs = {"lower", "is_digit", "is_punct", "sents"} # annotations read, see parsing.Parser
+
 def is_small_number(tok, thresh = 1000):
     """ Determines whether a token represents a "small" number (digit).
 
@@ -23,6 +32,63 @@ def get_lowered_tokens(doc):
     """
     return [tok.lower_ for tok in doc]
 
+Lexicons = namedtuple("Lexicons", ['not_list_units', 'flag_words', 'number_intros', 'list_words', 'things'])
+
+@lru_cache(maxsize = None)
+def lexicons():
+    """ The listicle word lists, as hashes of the lower-cased strings so they can be compared against
+    token attribute arrays. Built on first use, so importing this module doesn't import spaCy.
+
+    Returns:
+        Lexicons: frozensets of hashes (and the hash of "things")
+    """
+    from spacy.strings import hash_string
+    return Lexicons(not_list_units = frozenset(hash_string(w) for w in ["minutes", "percent", "hours"]),
+                    flag_words = frozenset(hash_string(w) for w in ["police", "dead", "shot", "killed", "injured"]),
+                    number_intros = frozenset(hash_string(w) for w in ["top", "these", "the"]),
+                    list_words = frozenset(hash_string(w) for w in ["list", "ranked"]),
+                    things = hash_string("things"))
+
+def scan_listicle(doc, sent_bounds, thresh = 1000):
+    """ Listicle detection in one forward scan over the document's token attribute arrays.
+    Takes the sentence boundaries explicitly, so it also works on documents that haven't been parsed.
+
+    Args:
+        doc (spacy.tokens.doc.Doc): a spaCy document representing an article title
+        sent_bounds (list of tuples): (start, end) token offsets of each sentence
+        thresh (int): threshold for what should be considered a "small" number
+
+    Returns:
+        bool: whether the document is a listicle
+    """
+    from spacy.attrs import LOWER, IS_DIGIT, IS_PUNCT
+    not_list_units, flag_words, number_intros, list_words, things = lexicons()
+    lowers, digits, puncts = doc.to_array([LOWER, IS_DIGIT, IS_PUNCT]).T.tolist()
+    n = len(lowers)
+    sent_ends = dict(sent_bounds)
+    has_flag = None
+
+    def small(i):
+        return digits[i] and int(doc[i].text) <= thresh
+
+    for i in range(n):
+        # a sentence that starts with a small number, not followed by a unit or punctuation
+        if i in sent_ends and i + 1 < sent_ends[i] and small(i):
+            if has_flag is None:
+                has_flag = not flag_words.isdisjoint(lowers)
+            if lowers[i + 1] not in not_list_units and not puncts[i + 1] and not has_flag:
+                return True
+        lower = lowers[i]
+        if lower in number_intros:
+            if i + 1 < n and small(i + 1):
+                return True
+        elif lower in list_words:
+            return True
+        elif i + 1 < n and lowers[i + 1] == things and small(i):
+            return True
+    return False
+
+@traced("is_listicle")
 def is_listicle(doc):
     """ Determines whether an article is a listicle based on its title.
     Obviously not perfect.
@@ -33,35 +99,18 @@ def is_listicle(doc):
     Returns:
         bool: whether the document is a listicle
     """
-    for sent in doc.sents:
-        if is_small_number(sent[0]):
-            ltoks = get_lowered_tokens(doc)
-            flag_words = ["police", "dead", "shot", "killed", "injured"]
-            try:
-                if sent[1].lower_ != "minutes" and \
-                    sent[1].lower_ != "percent" and \
-                    sent[1].lower_ != "hours" and \
-                    not sent[1].is_punct and \
-                    not any([word in ltoks for word in flag_words]):
-                    return True
-            except IndexError:
-                pass
-    for i, tok in enumerate(doc):
-        if tok.lower_ == "top" or tok.lower_ == "these" or tok.lower_ == "the":
-            try:
-                if is_small_number(doc[i + 1]):
-                    return True
-            except IndexError:
-                pass
-        elif tok.lower_ == "list" or tok.lower_ == "ranked":
-            return True
-        elif is_small_number(tok):
-            try:
-                if doc[i + 1].lower_ == 'things':
-                    return True
-            except IndexError:
-                pass
-    return False
+    return scan_listicle(doc, [(sent.start, sent.end) for sent in doc.sents])
+
+def classify(docs):
+    """ Run is_listicle over a stream of documents.
+
+    Args:
+        docs (iterable of spacy.tokens.doc.Doc): spaCy documents representing article titles
+
+    Returns:
+        numpy.array: boolean array, true for each document that is a listicle
+    """
+    return np.fromiter((is_listicle(doc) for doc in docs), dtype = bool)
 
 # Extracting list items from listicles
 
@@ -0,0 +1,204 @@
+""" Streaming loader for the clickbait corpus.
+
+Reads instances.jsonl in fixed-size batches, joins each batch against the truth labels
+and writes the cleaned result out as a directory of parquet files, one per batch.
+Memory use is bounded by the batch size (plus the truth labels, which are small).
+"""
+
+import os
+from itertools import islice
+
+import jsonlines as jl
+import pandas as pd
+
+from clean import clean_instance
+from parallel import ordered_map
+from tracing import stage
+
+truth_labels = ['truthJudgments', 'truthMean', 'truthMedian', 'truthMode', 'truthClass']
+
+def read_batches(path, batch_size = 10000):
+    """ Read a jsonl file in batches.
+
+    Args:
+        path (string): path to a jsonl file
+        batch_size (int): maximum number of objects per batch
+
+    Returns:
+        generator of lists of dicts: the objects in the file, batch by batch
+    """
+    with jl.open(path) as reader:
+        it = iter(reader)
+        batch = list(islice(it, batch_size))
+        while batch:
+            yield batch
+            batch = list(islice(it, batch_size))
+
+def load_truth(path):
+    """ Build the hash table side of the instance/truth join.
+
+    Args:
+        path (string): path to truth.jsonl
+
+    Returns:
+        dict: maps instance id (as a string) to a tuple of truth label values
+    """
+    truth = {}
+    with jl.open(path) as reader:
+        for obj in reader:
+            truth[str(obj['id'])] = tuple(obj[label] for label in truth_labels)
+    return truth
+
+def join_truth(batch, truth):
+    """ Attach truth labels to a batch of instances. Instances without labels get None.
+
+    Args:
+        batch (list of dicts): instances, as read from instances.jsonl
+        truth (dict): output of load_truth
+
+    Returns:
+        list of dicts: the instances with truth label fields added
+    """
+    missing = (None,) * len(truth_labels)
+    joined = []
+    for obj in batch:
+        obj = dict(obj)
+        obj.update(zip(truth_labels, truth.get(str(obj['id']), missing)))
+        joined.append(obj)
+    return joined
+
+def clean_batch(batch):
+    """ Clean the text fields of every instance in a batch.
+
+    Args:
+        batch (list of dicts): instances, as read from instances.jsonl
+
+    Returns:
+        list of dicts: the cleaned instances
+    """
+    return [clean_instance(obj) for obj in batch]
+
+def clean_corpus(path, workers = 1, chunksize = 100):
+    """ Clean a jsonl file of instances, sharding it across a process pool.
+    Shards come back in input order, so the output is the same as a serial run.
+
+    Args:
+        path (string): path to instances.jsonl
+        workers (int): number of worker processes; 1 cleans in this process
+        chunksize (int): number of instances per shard
+
+    Returns:
+        generator of lists of dicts: cleaned shards, in file order
+    """
+    return ordered_map(clean_batch, read_batches(path, chunksize), workers)
+
+def rebatch(shards, batch_size):
+    """ Regroup a stream of shards into batches of a fixed size.
+
+    Args:
+        shards (iterable of lists): the shards, in order
+        batch_size (int): number of items per batch; the last batch may be smaller
+
+    Returns:
+        generator of lists: the same items, in the same order, batch_size at a time
+    """
+    batch = []
+    for shard in shards:
+        batch.extend(shard)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+def iter_corpus(instances_path, truth_path, batch_size = 10000, workers = 1, dedup = None, chunksize = 100):
+    """ Stream the cleaned, labelled corpus in batches.
+
+    Args:
+        instances_path (string): path to instances.jsonl
+        truth_path (string): path to truth.jsonl
+        batch_size (int): maximum number of instances per batch
+        workers (int): number of processes used for cleaning
+        dedup (dedup.NearDuplicateIndex): if given, cleaned article bodies are added to it and each
+            instance gets a clusterId column: the id of the first near-identical article
+        chunksize (int): number of instances per cleaning shard; kept small so every worker gets
+            shards even on a small corpus, and at most 4 * workers shards are in flight at once
+
+    Returns:
+        generator of pandas.DataFrame: cleaned batches indexed by id, in file order
+    """
+    truth = load_truth(truth_path)
+    for batch in rebatch(clean_corpus(instances_path, workers, chunksize), batch_size):
+        records = join_truth(batch, truth)
+        if dedup is not None:
+            for obj in records:
+                obj['clusterId'] = dedup.add(obj['id'], obj['targetParagraphs'])
+        yield pd.DataFrame.from_records(records).set_index('id')
+
+def write_corpus(instances_path, truth_path, out_dir, batch_size = 10000, workers = 1, dedup = None, chunksize = 100):
+    """ Clean the corpus and write it to a directory of parquet files.
+
+    Args:
+        instances_path (string): path to instances.jsonl
+        truth_path (string): path to truth.jsonl
+        out_dir (string): directory to write part-NNNNN.parquet files to
+        batch_size (int): maximum number of instances per parquet file
+        workers (int): number of processes used for cleaning
+        dedup (dedup.NearDuplicateIndex): near-duplicate index for clustering articles (optional)
+        chunksize (int): number of instances per cleaning shard, see iter_corpus
+
+    Returns:
+        int: number of instances written
+    """
+    os.makedirs(out_dir, exist_ok = True)
+    total = 0
+    with stage("loader.write_corpus") as s:
+        for i, df in enumerate(iter_corpus(instances_path, truth_path, batch_size, workers, dedup, chunksize)):
+            df.to_parquet(os.path.join(out_dir, "part-{:05d}.parquet".format(i)))
+            total += len(df)
+        s.items = total
+    return total
+
+def read_corpus(path, columns = None):
+    """ Read a corpus written by write_corpus back into a single data frame.
+
+    Args:
+        path (string): directory written by write_corpus
+        columns (list of strings): only read these columns (default all)
+
+    Returns:
+        pandas.DataFrame: the corpus, indexed by id
+    """
+    parts = sorted(p for p in os.listdir(path) if p.endswith(".parquet"))
+    return pd.concat([pd.read_parquet(os.path.join(path, p), columns = columns) for p in parts])
+
+def corpus_columns(path):
+    """ List the columns of a corpus written by write_corpus, without reading any rows.
+
+    Args:
+        path (string): directory written by write_corpus
+
+    Returns:
+        list of strings: column names (the id index isn't included)
+    """
+    import pyarrow.parquet as pq
+    parts = sorted(p for p in os.listdir(path) if p.endswith(".parquet"))
+    return [name for name in pq.read_schema(os.path.join(path, parts[0])).names if name != 'id' and not name.startswith("__")]
+
+def read_clusters(path, columns = ()):
+    """ Read some columns of a corpus written by write_corpus, along with each article's near-duplicate cluster.
+
+    Args:
+        path (string): directory written by write_corpus
+        columns (list of strings): other columns to read (default none, just the clusters)
+
+    Returns:
+        pandas.DataFrame: the columns and clusterId, indexed by id; a corpus written without a dedup
+            index has no clusterId column, so every article is then its own cluster
+    """
+    columns = list(columns)
+    clustered = 'clusterId' in corpus_columns(path)
+    df = read_corpus(path, columns = columns + ['clusterId'] if clustered else columns)
+    if not clustered:
+        df['clusterId'] = df.index
+    return df
@@ -0,0 +1,168 @@
+""" Match title entities against article entities for a whole corpus.
+
+Streams (id, title, article) triples through match_title_ents in worker processes and appends
+one JSON line per pair to an output file as results come in. Titles of the same article in a
+chunk share one copy of it and one index of it. An interrupted run can be resumed:
+pairs whose ids are already in the output file are skipped. With an exported vector table (see
+vector_table), titles whose noun chunks don't occur in the article fall back to vector similarity;
+the table is memory-mapped, so all workers share one copy.
+"""
+
+import os
+import json
+import time
+from collections import OrderedDict
+
+from match_title_ents import match_title_ents
+
+worker_vocab = None
+worker_vectors = None
+
+def _init_worker(lang, vectors_path):
+    global worker_vocab, worker_vectors
+    from parsing import blank_vocab
+    worker_vocab = blank_vocab(lang)
+    worker_vectors = _load_vectors(vectors_path)
+
+def _load_vectors(path):
+    if path is None:
+        return None
+    from vector_table import load_table
+    return load_table(path)
+
+def _match_chunk(ids, titles, articles, article_of, vectors = None):
+    from match_title_ents import ArticleIndex
+    # each article's index is built once for all its titles in the chunk, and dropped with the chunk
+    indexes = [None] * len(articles)
+    records = []
+    for id, title, a in zip(ids, titles, article_of):
+        start = time.perf_counter()
+        if indexes[a] is None:
+            indexes[a] = ArticleIndex(articles[a])
+        matches = match_title_ents(title, articles[a], index = indexes[a], vectors = vectors)
+        records.append({'id': id, 'matches': matches, 'seconds': time.perf_counter() - start})
+    return records
+
+def _match_serialized(args):
+    from doc_cache import docs_from_bytes
+    ids, titles, articles, article_of = args
+    return _match_chunk(ids, docs_from_bytes(titles, worker_vocab), docs_from_bytes(articles, worker_vocab),
+                        article_of, worker_vectors)
+
+def completed_ids(path):
+    """ Read the ids already written to an output file, dropping a trailing partial line
+        left behind by an interrupted run.
+
+    Args:
+        path (string): path to the jsonl output
+
+    Returns:
+        set of strings: ids with results in the file
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    valid_end = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line.decode("utf-8"))['id'])
+            except ValueError:
+                break
+            valid_end += len(line)
+    with open(path, "r+b") as f:
+        f.truncate(valid_end)
+    return done
+
+def _chunks(pairs, chunksize, done):
+    """ Group pairs into chunks, listing each article once per chunk.
+
+    Returns:
+        generator of tuples: ids, titles, distinct articles, and for each id the position of its article
+    """
+    ids, titles, articles, article_of, positions = [], [], [], [], {}
+    for id, title, article, key in pairs:
+        if id in done:
+            continue
+        if key not in positions:
+            positions[key] = len(articles)
+            articles.append(article)
+        ids.append(id)
+        titles.append(title)
+        article_of.append(positions[key])
+        if len(ids) == chunksize:
+            yield ids, titles, articles, article_of
+            ids, titles, articles, article_of, positions = [], [], [], [], {}
+    if ids:
+        yield ids, titles, articles, article_of
+
+def group_by_article(ids, article_key):
+    """ Order ids so that titles of the same article are next to each other, and so land in the
+        same chunk. Articles are kept in the order of their first title.
+
+    Args:
+        ids (iterable of strings): corpus ids
+        article_key (dict): corpus id -> article key, e.g. DocCache.ids
+
+    Returns:
+        list of strings: the ids, grouped by article key
+    """
+    groups = OrderedDict() # article key -> ids
+    for id in ids:
+        groups.setdefault(article_key[id], []).append(id)
+    return [id for group in groups.values() for id in group]
+
+def match_corpus(pairs, out_path, workers = 1, chunksize = 64, lang = 'en', vectors_path = None):
+    """ Match title entities for a stream of title/article pairs, writing results as jsonl.
+
+    Args:
+        pairs (iterable of tuples): (id, title Doc, article Doc, article key); pairs with the same key
+            (e.g. the article's DocCache text key, or its clusterId) share one article, which is
+            sent to a worker and indexed once per chunk, so keep them close together in the stream
+        out_path (string): jsonl file to append {"id", "matches", "seconds"} records to
+        workers (int): number of worker processes; 1 matches in this process
+        chunksize (int): number of pairs sent to a worker at a time
+        lang (string): language of the documents, used to rebuild them in worker processes
+        vectors_path (string): directory of an exported vector table for the similarity fallback (optional)
+
+    Returns:
+        int: number of pairs matched in this run
+    """
+    from parallel import ordered_map
+
+    chunks = _chunks(pairs, chunksize, completed_ids(out_path))
+    if workers <= 1:
+        vectors = _load_vectors(vectors_path)
+        results = (_match_chunk(*chunk, vectors = vectors) for chunk in chunks)
+    else:
+        from doc_cache import docs_to_bytes
+        # documents are sent without their vocab; workers attach them to a blank vocab for the language
+        tasks = ((ids, docs_to_bytes(titles), docs_to_bytes(articles), article_of)
+                 for ids, titles, articles, article_of in chunks)
+        results = ordered_map(_match_serialized, tasks, workers, initializer = _init_worker, initargs = (lang, vectors_path))
+    count = 0
+    with open(out_path, "a", encoding = "utf-8") as out:
+        for records in results:
+            for record in records:
+                out.write(json.dumps(record) + "\n")
+            out.flush() # everything written so far survives an interruption
+            count += len(records)
+    return count
+
+def main():
+    from doc_cache import DocCache
+    from parsing import load_model
+
+    nlp = load_model('en_core_web_lg')
+    titles = DocCache("Data/doc_cache/titles", nlp)
+    articles = DocCache("Data/doc_cache/articles", nlp)
+    # near-duplicate articles share their representative's text key (see doc_cache.main), but their
+    # titles are added to the cache after all the representatives; grouping by key puts them in
+    # the representative's chunk, and otherwise keeps cache order so shards are read one after another
+    ids = group_by_article([id for id in titles.ids if id in articles], articles.ids)
+    pairs = ((id, titles.get(id), articles.get(id), articles.ids[id]) for id in ids)
+    vectors_path = "Data/vectors" if os.path.exists("Data/vectors") else None # see vector_table
+    print("pairs matched:", match_corpus(pairs, "Results/title_matches.jsonl", workers = os.cpu_count(), vectors_path = vectors_path))
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
-import spacy
-from spacy.tokens import Doc
+from collections import OrderedDict
+
+import numpy as np
+
+from tracing import traced
+
+pipeline_needs = {"lemma", "sents", "dep", "noun_chunks", "ents"} # annotations read, see parsing.Parser
 
 def filter_spans(spans):
     """ Remove duplicate tokens from a list of spans.
@@ -53,53 +58,223 @@ def retokenize_ents(doc):
             retokenizer.merge(span, attrs = attrs)
     return mapping
 
-def match_title_ents(title, doc):
+class MergedTokens(object):
+    """ The token sequence retokenize_ents would produce, computed from index arrays without
+        modifying (or copying) the document. Position k describes the k-th token of the
+        retokenized document.
+
+    Args:
+        doc (spacy.tokens.doc.Doc): a parsed spaCy document
+
+    Attributes:
+        mapping (dict): same as the output of retokenize_ents; original index -> merged index,
+            for tokens inside merged spans
+        text (list of strings): text of each merged token
+        has_ent (list of bools): whether any of the merged token's constituents is a named entity
+        is_root (list of bools): whether the merged token is the root of its sentence
+        head (list of ints): merged index of each merged token's syntactic head
+        bounds (list of tuples): (start, end) offsets in the original document of each merged token
+        spans (list of ints): merged indices of the tokens that came from noun chunks or entities
+    """
+
+    def __init__(self, doc):
+        spans = filter_spans(list(doc.ents) + list(doc.noun_chunks))
+        span_at = {span.start: span for span in spans}
+        merged_index = [0] * len(doc)
+        roots = [] # original index of the token whose head and dep each merged token takes
+        self.mapping = {}
+        self.text = []
+        self.has_ent = []
+        self.bounds = []
+        self.spans = []
+        i = 0
+        while i < len(doc):
+            pos = len(roots)
+            span = span_at.get(i)
+            if span is not None:
+                for j in range(span.start, span.end):
+                    merged_index[j] = pos
+                    self.mapping[j] = pos
+                # a merged span takes the head and dependency label of its root
+                roots.append(span.root.i)
+                self.text.append(span.text)
+                self.has_ent.append(any(tok.ent_type for tok in span))
+                self.bounds.append((span.start, span.end))
+                self.spans.append(pos)
+                i = span.end
+            else:
+                merged_index[i] = pos
+                roots.append(i)
+                self.text.append(doc[i].text)
+                self.has_ent.append(bool(doc[i].ent_type))
+                self.bounds.append((i, i + 1))
+                i += 1
+        self.is_root = [doc[r].dep_ == "ROOT" for r in roots]
+        self.head = [merged_index[doc[r].head.i] for r in roots]
+
+class ArticleIndex(object):
+    """ Everything match_title_ents needs from an article, built once so that several titles can be
+        matched against the same article at a cost proportional to the number of hits.
+
+    Args:
+        doc (spacy.tokens.doc.Doc): a parsed spaCy document containing the body of an article
+
+    Attributes:
+        positions (dict): lower-cased lemma -> sorted token positions where it occurs
+        sent_of (list of ints): sentence number of each token
+        merged (MergedTokens): the article's retokenized view, see MergedTokens
+        orths (list of ints): orth hash of each token, for looking up vectors
+    """
+
+    def __init__(self, doc):
+        self.positions = {}
+        self.orths = []
+        for tok in doc:
+            self.positions.setdefault(tok.lemma_.lower(), []).append(tok.i)
+            self.orths.append(tok.orth)
+        self.sent_of = [0] * len(doc)
+        for n, sent in enumerate(doc.sents):
+            self.sent_of[sent.start:sent.end] = [n] * len(sent)
+        self.merged = MergedTokens(doc)
+        self.candidates = None # (vector table, unit-length vectors of merged.spans), built on first use
+
+    def span_vectors(self, table):
+        """ Unit-length vectors of the article's noun chunks and entities, computed once per table.
+
+        Args:
+            table (vector_table.VectorTable): the word vectors
+
+        Returns:
+            numpy.array: shape (len(merged.spans), table.width); row k belongs to merged token merged.spans[k]
+        """
+        if self.candidates is None or self.candidates[0] is not table:
+            bounds = [self.merged.bounds[k] for k in self.merged.spans]
+            self.candidates = (table, table.span_vectors(self.orths, bounds))
+        return self.candidates[1]
+
+    def first_per_sentence(self, lemma):
+        """ Find the first occurrence of a lemma in each sentence that contains it.
+
+        Args:
+            lemma (string): the lemma to look up (matched against lower-cased article lemmas)
+
+        Returns:
+            list of ints: token positions, in document order
+        """
+        hits = []
+        last_sent = -1
+        for i in self.positions.get(lemma, ()):
+            if self.sent_of[i] != last_sent:
+                hits.append(i)
+                last_sent = self.sent_of[i]
+        return hits
+
+index_cache = OrderedDict() # id(doc) -> (doc, ArticleIndex), least recently used first
+index_cache_size = 256
+
+def article_index(doc):
+    """ Get the ArticleIndex for a document, building it the first time and keeping it in a small
+        LRU cache so later titles for the same article reuse it. (It isn't stored in the document's
+        user_data because that would break Doc serialization.)
+
+    Args:
+        doc (spacy.tokens.doc.Doc): a parsed spaCy document containing the body of an article
+
+    Returns:
+        ArticleIndex: the document's index
+    """
+    key = id(doc) # the cache holds a reference to doc, so the id can't be reused while cached
+    if key in index_cache:
+        index_cache.move_to_end(key)
+    else:
+        index_cache[key] = (doc, ArticleIndex(doc))
+        if len(index_cache) > index_cache_size:
+            index_cache.popitem(last = False)
+    return index_cache[key][1]
+
+def similar_spans(chunks, title, index, vectors, top_k = 3, min_similarity = 0.6):
+    """ Find the article's noun chunks and entities closest in meaning to some title noun chunks,
+        by cosine similarity of their averaged word vectors, with one matrix product for all of them.
+
+    Args:
+        chunks (list of spacy.tokens.span.Span): noun chunks from the title
+        title (spacy.tokens.doc.Doc): the title the chunks belong to
+        index (ArticleIndex): index of the article
+        vectors (vector_table.VectorTable): the word vectors
+        top_k (int): maximum number of article spans per chunk
+        min_similarity (float): minimum cosine similarity for an article span to count
+
+    Returns:
+        list of lists: for each chunk, merged indices of the most similar article spans, most similar first
+    """
+    candidates = index.span_vectors(vectors)
+    if not len(candidates):
+        return [[] for _ in chunks]
+    queries = vectors.span_vectors([tok.orth for tok in title], [(chunk.start, chunk.end) for chunk in chunks])
+    similarity = queries @ candidates.T # shape (# of chunks, # of article spans)
+    top = np.argsort(-similarity, axis = 1, kind = "stable")[:, :top_k] # ties go to the earlier span
+    return [[index.merged.spans[c] for c in cols if row[c] >= min_similarity] for row, cols in zip(similarity, top)]
+
+@traced("match_title_ents")
+def match_title_ents(title, doc, index = None, vectors = None, top_k = 3, min_similarity = 0.6):
     """ Match ambiguous entities in an article title to named entities in the article.
 
     Args:
         title (spacy.tokens.doc.Doc): a spaCy document containing the title of the article
         doc (spacy.tokens.doc.Doc): a spaCy document containing the body of the article
+        index (ArticleIndex): prebuilt index of doc (default: built on first use and cached, see article_index)
+        vectors (vector_table.VectorTable): word vectors; if given, a title noun chunk whose root never
+            appears in the article is matched through the article spans most similar to it instead
+        top_k (int): number of similar article spans to try for such a chunk
+        min_similarity (float): minimum cosine similarity for a similar article span
 
     Returns:
         dict: keys are entities from the article title, values are lists of possible matches in the article body
     """ 
-    doc_lemmas = [tok.lemma_.lower() for tok in doc] # look at lemmas since exact form of target root might not be used
-    retok = Doc(doc.vocab).from_bytes(doc.to_bytes()) # don't want to overwrite tokenization of original document
-    mapping = retokenize_ents(retok)
+    index = index or article_index(doc) # looks at lemmas since exact form of target root might not be used
+    merged = index.merged # the retokenized view of doc, without modifying or copying it
+    mapping = merged.mapping
     matched = {}
+    unmatched = [] # chunks whose root doesn't occur in the article
     # want to try to locate an in-document match for each noun chunk, 
     # although we need some way to determine whether a chunk needs matching or not
     for chunk in title.noun_chunks:
         # print("THING WE'RE TRYING TO MATCH:", chunk)
         target_root = chunk.root # assumption: the root of the phrase should reoccur somewhere in doc
         # print("TARGET ROOT:", target_root)
-        for sent in doc.sents:
-            sent_lemmas = doc_lemmas[sent.start:sent.end]
-            if target_root.lemma_ in sent_lemmas:
-                # print("ROOT FOUND IN SENTENCE:", sent)
-                # locate the retokenized token that contains the target root
-                idx = doc_lemmas.index(target_root.lemma_, sent.start, sent.end)
-                # I guess it's possible for target root to not be part of a noun chunk (somehow???)
-                if idx in mapping:
-                    pos = mapping[idx]
-                    target_phrase = retok[pos]
-                    match = None
-                    # print("TARGET PHRASE:", target_phrase)
-                else:
-                    match = "?"
-                while not match:
-                    if target_phrase.ent_type:
-                        match = target_phrase
-                        # print("MATCH FOUND!:", match)
-                        if chunk.text in matched:
-                            matched[chunk.text].append(match.text)
-                        else:
-                            matched[chunk.text] = [match.text]
-                    elif target_phrase.dep_ == "ROOT":
-                        match = "?"
-                        # print("MATCH NOT FOUND")
+        # first occurrence of the root in each sentence it appears in
+        hits = index.first_per_sentence(target_root.lemma_)
+        if not hits:
+            unmatched.append(chunk)
+        for idx in hits:
+            # locate the retokenized token that contains the target root
+            # I guess it's possible for target root to not be part of a noun chunk (somehow???)
+            if idx in mapping:
+                target_phrase = mapping[idx]
+                match = None
+                # print("TARGET PHRASE:", merged.text[target_phrase])
+            else:
+                match = "?"
+            while not match:
+                if merged.has_ent[target_phrase]:
+                    match = merged.text[target_phrase]
+                    # print("MATCH FOUND!:", match)
+                    if chunk.text in matched:
+                        matched[chunk.text].append(match)
                     else:
-                        target_phrase = target_phrase.head
-        # what if the root isn't found?
-        # IDEA: look for terms with high cosine similarity to the root/phrase
+                        matched[chunk.text] = [match]
+                elif merged.is_root[target_phrase]:
+                    match = "?"
+                    # print("MATCH NOT FOUND")
+                else:
+                    target_phrase = merged.head[target_phrase]
+    # what if the root isn't found? look for article spans with high cosine similarity to the phrase
+    if vectors is not None and unmatched:
+        for chunk, similar in zip(unmatched, similar_spans(unmatched, title, index, vectors, top_k, min_similarity)):
+            for target_phrase in similar:
+                # same walk up the heads as above, from the similar span
+                while not merged.has_ent[target_phrase] and not merged.is_root[target_phrase]:
+                    target_phrase = merged.head[target_phrase]
+                if merged.has_ent[target_phrase] and merged.text[target_phrase] not in matched.get(chunk.text, ()):
+                    matched.setdefault(chunk.text, []).append(merged.text[target_phrase])
     return matched
\ No newline at end of file
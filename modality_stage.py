@@ -0,0 +1,145 @@
+""" pattern.en modality as a standalone, restartable stage.
+
+pattern's parser fails intermittently. Rather than rerunning all of dimensions.py until it
+happens to work, each title's modality is checkpointed to a sqlite store as soon as it is
+computed, failed titles are retried with exponential backoff, and a rerun only computes
+titles that aren't in the store yet. Titles can be processed in worker processes so that a
+crash in pattern only loses the titles that were in flight.
+"""
+
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+def pattern_parse(text):
+    """ Parses a text into a pattern Sentence object.
+    """
+    from pattern.en import parse, Sentence
+    s = parse(text, lemmata = True)
+    s = Sentence(s)
+    return s
+
+def title_modality(text):
+    """ Computes the pattern.en modality of a title.
+
+    Args:
+        text (string): the title
+
+    Returns:
+        float: modality, from -1 (doubtful) to 1 (certain)
+    """
+    from pattern.en import modality
+    return modality(pattern_parse(text))
+
+class ModalityStore(object):
+    """ On-disk checkpoint of computed modalities, keyed by title id.
+
+    Args:
+        path (string): path to the sqlite database (created if it doesn't exist)
+        commit_every (int): number of results to write per transaction; committing each title
+            separately syncs the database to disk once per title
+    """
+
+    def __init__(self, path, commit_every = 100):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS modality (id TEXT PRIMARY KEY, value REAL)")
+        self.conn.commit()
+        self.commit_every = commit_every
+        self.pending = 0
+
+    def __contains__(self, id):
+        return self.conn.execute("SELECT 1 FROM modality WHERE id = ?", (id,)).fetchone() is not None
+
+    def done(self):
+        """ Ids whose modality has already been computed.
+
+        Returns:
+            set of strings: the stored ids
+        """
+        return set(row[0] for row in self.conn.execute("SELECT id FROM modality"))
+
+    def get_all(self):
+        """ All stored results.
+
+        Returns:
+            dict: id -> modality
+        """
+        return dict(self.conn.execute("SELECT id, value FROM modality"))
+
+    def put(self, id, value):
+        """ Store a title's modality. It is committed with the next commit_every results, or by flush.
+        """
+        self.conn.execute("INSERT OR REPLACE INTO modality VALUES (?, ?)", (id, value))
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        """ Commit the results stored since the last commit.
+        """
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+def _attempt_serial(items, store):
+    failed = []
+    for id, text in items:
+        try:
+            store.put(id, title_modality(text))
+        except Exception:
+            failed.append((id, text))
+    return failed
+
+def _attempt_parallel(items, store, workers):
+    failed = []
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(title_modality, text): (id, text) for id, text in items}
+            for future in as_completed(futures):
+                try:
+                    store.put(futures[future][0], future.result())
+                except BrokenProcessPool:
+                    raise
+                except Exception:
+                    failed.append(futures[future])
+    except BrokenProcessPool:
+        # a worker died; whatever wasn't stored gets another try in the next round
+        done = store.done()
+        failed = [(id, text) for id, text in items if id not in done]
+    return failed
+
+def run_modality(items, store_path = "modality.sqlite", retries = 5, backoff = 0.5, workers = 1):
+    """ Compute modality for every title not already in the store, retrying failures.
+
+    Args:
+        items (iterable of tuples): (id, title text) pairs
+        store_path (string): path to the sqlite checkpoint
+        retries (int): number of times to retry titles that failed
+        backoff (float): seconds to wait before the first retry; doubles with each retry
+        workers (int): number of worker processes; 1 runs in this process
+
+    Returns:
+        dict: id -> modality for every title that has been computed, in this run or an earlier one
+    """
+    store = ModalityStore(store_path)
+    done = store.done()
+    todo = [(id, text) for id, text in items if id not in done]
+    for attempt in range(retries + 1):
+        if not todo:
+            break
+        if attempt > 0:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        if workers <= 1:
+            todo = _attempt_serial(todo, store)
+        else:
+            todo = _attempt_parallel(todo, store, workers)
+        store.flush() # checkpoint each round before waiting to retry
+    if todo:
+        print("modality failed for {} titles after {} retries; rerun to try them again".format(len(todo), retries))
+    results = store.get_all()
+    store.close()
+    return results
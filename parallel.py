@@ -0,0 +1,38 @@
+""" Ordered, bounded parallel map over a stream.
+
+multiprocessing.Pool.imap reads its whole input ahead of the workers, which defeats
+streaming over a large corpus. ordered_map only keeps a fixed number of tasks in
+flight and yields results in input order as soon as they're ready.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+def ordered_map(fn, items, workers = 1, window = None, initializer = None, initargs = ()):
+    """ Apply fn to each item, optionally in worker processes, yielding results in input order.
+
+    Args:
+        fn (function): picklable function of one argument
+        items (iterable): inputs to fn
+        workers (int): number of worker processes; 1 runs everything in this process
+        window (int): maximum number of tasks in flight (default 4 per worker)
+        initializer (function): run once in each worker process when it starts
+        initargs (tuple): arguments for initializer
+
+    Returns:
+        generator: fn(item) for each item, in the order of items
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(fn, items)
+        return
+    window = window or 4 * workers
+    with ProcessPoolExecutor(workers, initializer = initializer, initargs = initargs) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
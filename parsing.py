@@ -0,0 +1,130 @@
+""" Shared parsing service.
+
+Summarizers and feature extractors declare which annotations they read (as a set of
+strings in a module-level pipeline_needs). The parser only runs the pipeline components
+those annotations depend on and streams texts through nlp.pipe in batches, optionally
+across several processes. Documents come back in input order. When sentence boundaries
+are needed but dependency labels aren't, they come from the model's senter component
+(in spaCy v3 models) instead of the much slower dependency parser.
+"""
+
+from functools import lru_cache
+
+# annotations that don't depend on any pipeline component (lexical attributes, tokenization)
+lexical = {"text", "lower", "norm", "is_stop", "is_punct", "is_digit"}
+
+# pipeline components each annotation depends on; names cover spaCy v2 and v3 models,
+# and only the ones actually present in the loaded model are used
+requirements = {
+    "lemma": ["tok2vec", "tagger", "attribute_ruler", "lemmatizer"],
+    "pos": ["tok2vec", "tagger", "attribute_ruler"],
+    "tag": ["tok2vec", "tagger", "attribute_ruler"],
+    "sents": ["tok2vec", "parser"], # or senter, see Parser
+    "dep": ["tok2vec", "parser"],
+    "noun_chunks": ["tok2vec", "tagger", "attribute_ruler", "parser"],
+    "ents": ["tok2vec", "ner"],
+}
+
+@lru_cache(maxsize = None)
+def load_model(name):
+    """ Load a spaCy model once per process. Everything that needs a model should get it from here,
+    so a process never holds two copies of the same model.
+
+    Args:
+        name (string): model name, e.g. 'en_core_web_lg'
+
+    Returns:
+        spacy.language.Language: the loaded model
+    """
+    import spacy
+    return spacy.load(name)
+
+@lru_cache(maxsize = None)
+def blank_vocab(lang):
+    """ A vocab for rebuilding serialized documents, created once per process.
+
+    Args:
+        lang (string): language code, e.g. 'en'
+
+    Returns:
+        spacy.vocab.Vocab: vocab of a blank model for the language
+    """
+    import spacy
+    return spacy.blank(lang).vocab
+
+def required_pipes(needs):
+    """ Work out which pipeline components are needed for a set of annotations.
+
+    Args:
+        needs (iterable of strings): annotation names, e.g. {"lemma", "sents"}
+
+    Returns:
+        set of strings: pipeline component names
+    """
+    pipes = set()
+    for need in needs:
+        if need in lexical:
+            continue
+        if need not in requirements:
+            raise ValueError("Unknown annotation: {}".format(need))
+        pipes.update(requirements[need])
+    return pipes
+
+class Parser(object):
+    """ Parses texts with only the pipeline components its consumers need.
+    Has the vocab, meta and pipe of a spaCy model, so it can stand in for one (e.g. in a DocCache).
+
+    Args:
+        nlp (spacy.language.Language or string): a loaded model, or the name of one to load
+        *consumers: sets of annotation names, or modules declaring pipeline_needs
+
+    Attributes:
+        pipes (list of strings): names of the pipeline components that run, in order
+    """
+
+    def __init__(self, nlp, *consumers):
+        if isinstance(nlp, str):
+            nlp = load_model(nlp)
+        self.nlp = nlp
+        self.vocab = nlp.vocab
+        self.meta = nlp.meta
+        self.needs = set()
+        for consumer in consumers:
+            self.needs.update(getattr(consumer, 'pipeline_needs', consumer))
+        keep = required_pipes(self.needs)
+        self.senter = None
+        if "sents" in self.needs and "parser" not in required_pipes(self.needs - {"sents"}) and "senter" in nlp.component_names:
+            # sentence boundaries without dependency labels; v3 models ship the senter disabled,
+            # so it's run after the rest of the pipeline rather than enabled on the shared model
+            keep = required_pipes(self.needs - {"sents"})
+            if "senter" in nlp.pipe_names:
+                keep.add("senter")
+            else:
+                self.senter = nlp.get_pipe("senter")
+        self.disable = [name for name in nlp.pipe_names if name not in keep]
+        self.pipes = [name for name in nlp.pipe_names if name in keep] + (["senter"] if self.senter else [])
+
+    @property
+    def max_length(self):
+        """ Longest text, in characters, the model will parse.
+        """
+        return self.nlp.max_length
+
+    def pipe(self, texts, batch_size = 256, n_process = 1):
+        """ Parse a stream of texts.
+
+        Args:
+            texts (iterable of strings): texts to parse
+            batch_size (int): number of texts per batch
+            n_process (int): number of processes to parse with
+
+        Returns:
+            generator of spacy.tokens.doc.Doc: parsed documents, in input order
+        """
+        docs = self.nlp.pipe(texts, batch_size = batch_size, n_process = n_process, disable = self.disable)
+        if self.senter is not None:
+            docs = self.senter.pipe(docs, batch_size = batch_size)
+        return docs
+
+    def __call__(self, text):
+        return next(iter(self.pipe([text])))
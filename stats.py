@@ -0,0 +1,184 @@
+""" Grouped means and correlations of the title dimensions with the truth labels.
+
+Replaces the CSV round trip through R (dim_stats.R, vad_analysis.R, titles_liwc.R) for the summary
+statistics: feature frames are read as they are (in memory, or from parquet), and everything is
+computed from a handful of running sums that can be updated batch by batch. For each dimension and
+target the sums n, Σx, Σy, Σx², Σy² and Σxy over the rows where both are present are accumulated
+with one masked matrix product each, so correlations over all dimensions take one pass and adding
+a new labelled batch doesn't touch the earlier ones. Missing values are dropped pairwise, as
+cor.test and mean(na.rm = TRUE) do.
+"""
+
+import json
+
+import numpy as np
+
+dimensions = ['polarity', 'subjectivity', 'modality', 'listicle', 'leadsWithQuestion', 'hasDeterminer',
+              'numNamedEntities', 'superlative', 'accusatory']
+targets = ['truthMean', 'truthMedian']
+
+class RunningStats(object):
+    """ Running per-group means and pairwise-complete correlation sums.
+
+    Args:
+        dimensions (list of strings): feature columns
+        targets (list of strings): label columns to correlate the features with
+        group (string): column to compute per-group means over
+    """
+
+    def __init__(self, dimensions = dimensions, targets = targets, group = 'truthClass'):
+        self.dimensions = list(dimensions)
+        self.targets = list(targets)
+        self.group = group
+        d, t = len(self.dimensions), len(self.targets)
+        self.group_counts = {} # group -> number of present values of each dimension
+        self.group_sums = {} # group -> sum of each dimension
+        # values are shifted by the first batch's means before the products are accumulated, so the
+        # sums stay small and r doesn't suffer from cancellation (correlation is shift invariant)
+        self.shift_x = None
+        self.shift_y = None
+        self.n = np.zeros((d, t))
+        self.sum_x = np.zeros((d, t))
+        self.sum_y = np.zeros((d, t))
+        self.sum_xx = np.zeros((d, t))
+        self.sum_yy = np.zeros((d, t))
+        self.sum_xy = np.zeros((d, t))
+
+    def update(self, df):
+        """ Add a batch of labelled rows.
+
+        Args:
+            df (pandas.DataFrame): must have the dimension, target and group columns; rows may be
+                unlabelled (missing targets and group)
+
+        Returns:
+            RunningStats: self
+        """
+        x = df[self.dimensions].to_numpy(dtype = np.float64)
+        y = df[self.targets].to_numpy(dtype = np.float64)
+        has_x, has_y = ~np.isnan(x), ~np.isnan(y)
+        if self.shift_x is None:
+            self.shift_x = np.where(has_x, x, 0.).sum(axis = 0) / np.maximum(has_x.sum(axis = 0), 1)
+            self.shift_y = np.where(has_y, y, 0.).sum(axis = 0) / np.maximum(has_y.sum(axis = 0), 1)
+        x0 = np.where(has_x, x - self.shift_x, 0.)
+        y0 = np.where(has_y, y - self.shift_y, 0.)
+        mx, my = has_x.astype(np.float64), has_y.astype(np.float64)
+        self.n += mx.T @ my
+        self.sum_x += x0.T @ my
+        self.sum_y += mx.T @ y0
+        self.sum_xx += (x0 * x0).T @ my
+        self.sum_yy += mx.T @ (y0 * y0)
+        self.sum_xy += x0.T @ y0
+
+        # rows without a group (instances with no truth labels) are left out of the group means only
+        labelled = df[self.group].notna().to_numpy()
+        groups, codes = np.unique(df[self.group][labelled].astype(str).to_numpy(), return_inverse = True)
+        onehot = np.zeros((len(codes), len(groups)))
+        onehot[np.arange(len(codes)), codes.ravel()] = 1.
+        counts = onehot.T @ mx[labelled]
+        sums = onehot.T @ np.where(has_x, x, 0.)[labelled]
+        for i, group in enumerate(groups):
+            self.group_counts[group] = self.group_counts.get(group, 0.) + counts[i]
+            self.group_sums[group] = self.group_sums.get(group, 0.) + sums[i]
+        return self
+
+    def means(self):
+        """ Mean of each dimension within each group.
+
+        Returns:
+            pandas.DataFrame: one row per group, one column per dimension; NaN where a group has no values
+        """
+        import pandas as pd
+        groups = sorted(self.group_counts)
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            values = [self.group_sums[g] / self.group_counts[g] for g in groups]
+        return pd.DataFrame(values, index = pd.Index(groups, name = self.group), columns = self.dimensions)
+
+    def correlations(self):
+        """ Pearson correlation of each dimension with each target, with two-sided p-values as
+        reported by cor.test.
+
+        Returns:
+            pandas.DataFrame: columns dimension, target, n, r and p; r and p are NaN where there
+                are fewer than 3 pairs or either variable is constant
+        """
+        import pandas as pd
+        from scipy.stats import t as t_dist
+        n = self.n
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            cov = n * self.sum_xy - self.sum_x * self.sum_y
+            var_x = n * self.sum_xx - self.sum_x ** 2
+            var_y = n * self.sum_yy - self.sum_y ** 2
+            r = np.clip(cov / np.sqrt(var_x * var_y), -1., 1.)
+            r[(n < 3) | (var_x <= 0) | (var_y <= 0)] = np.nan
+            df = n - 2
+            t = r * np.sqrt(df / (1. - r ** 2))
+            p = 2. * t_dist.sf(np.abs(t), df)
+        d, k = np.meshgrid(np.arange(len(self.dimensions)), np.arange(len(self.targets)), indexing = 'ij')
+        return pd.DataFrame({'dimension': np.array(self.dimensions)[d.ravel()],
+                             'target': np.array(self.targets)[k.ravel()],
+                             'n': n.ravel().astype(np.int64), 'r': r.ravel(), 'p': p.ravel()})
+
+    def save(self, path):
+        """ Save the running sums, so a later run can continue from them.
+
+        Args:
+            path (string): json file
+        """
+        state = {'dimensions': self.dimensions, 'targets': self.targets, 'group': self.group,
+                 'group_counts': {g: v.tolist() for g, v in self.group_counts.items()},
+                 'group_sums': {g: v.tolist() for g, v in self.group_sums.items()},
+                 'shift_x': None if self.shift_x is None else self.shift_x.tolist(),
+                 'shift_y': None if self.shift_y is None else self.shift_y.tolist()}
+        for name in ['n', 'sum_x', 'sum_y', 'sum_xx', 'sum_yy', 'sum_xy']:
+            state[name] = getattr(self, name).tolist()
+        with open(path, "w") as f:
+            json.dump(state, f)
+
+    @classmethod
+    def load(cls, path):
+        """ Load running sums saved with save.
+
+        Args:
+            path (string): json file
+
+        Returns:
+            RunningStats: the statistics so far
+        """
+        with open(path, "r") as f:
+            state = json.load(f)
+        stats = cls(state['dimensions'], state['targets'], state['group'])
+        stats.group_counts = {g: np.array(v) for g, v in state['group_counts'].items()}
+        stats.group_sums = {g: np.array(v) for g, v in state['group_sums'].items()}
+        if state['shift_x'] is not None:
+            stats.shift_x = np.array(state['shift_x'])
+            stats.shift_y = np.array(state['shift_y'])
+        for name in ['n', 'sum_x', 'sum_y', 'sum_xx', 'sum_yy', 'sum_xy']:
+            setattr(stats, name, np.array(state[name]))
+        return stats
+
+def main():
+    # fold new labelled feature batches into the saved statistics; dimensions.main writes
+    # Results/dim_features.parquet, and vad.main Results/vad_features.parquet (use --dimensions
+    # valence arousal dominance --out Results/vad for those)
+    import os
+    import argparse
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description = "Update grouped means and correlations with new labelled batches.")
+    parser.add_argument("batches", nargs = "+", help = "parquet files or directories with the dimension, target and group columns")
+    parser.add_argument("--dimensions", nargs = "+", default = dimensions)
+    parser.add_argument("--out", default = "Results/dim", help = "prefix of the means and correlations csv files")
+    parser.add_argument("--state", help = "saved statistics (default: the --out prefix + _stats_state.json)")
+    args = parser.parse_args()
+
+    state = args.state or args.out + "_stats_state.json"
+    stats = RunningStats.load(state) if os.path.exists(state) else RunningStats(args.dimensions)
+    for path in args.batches:
+        stats.update(pd.read_parquet(path, columns = stats.dimensions + stats.targets + [stats.group]))
+    stats.save(state)
+    stats.means().to_csv(args.out + "_means.csv")
+    stats.correlations().to_csv(args.out + "_correlations.csv", index = False)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,18 @@
-import spacy
-import operator
-from collections import Counter
+import heapq
+from collections import Counter, defaultdict
 
+from tracing import traced
+
+pipeline_needs = {"norm", "is_stop", "is_punct", "sents"} # annotations read, see parsing.Parser
+
+@traced("sumbasic")
 def sumbasic(doc, sum_length = 1):
     """ Implementation of sumbasic text summarization algorithm. Picks representative sentences based on high word frequencies.
 
+    Each step takes the currently most probable word, picks the highest-weighted unpicked sentence
+    containing it, then squares the probabilities of that sentence's words. Term counts are computed
+    once per sentence, and only sentences sharing a word with the pick are rescored.
+
     Args:
         doc (spacy.tokens.doc.Doc): spacy document to summarize
         sum_length (int): number of sentences for the summary
@@ -12,36 +20,52 @@ def sumbasic(doc, sum_length = 1):
     Returns:
         string: document summary
     """
-    tokens = [tok.norm_ for tok in doc if not tok.is_punct and not tok.is_stop]
-    freqdist = Counter(tokens)
-    probs = [freqdist[key] / len(tokens) for key in freqdist]
-    probdict = dict(zip(freqdist.keys(), probs))
     sents = list(doc.sents)
-    most_frequent_word = max(probdict.items(), key = operator.itemgetter(1))[0]
+    term_ids = {} # norm -> term id, in order of first occurrence
+    sent_counts = [] # term id -> count, for each sentence
+    for sent in sents:
+        sent_counts.append(Counter(term_ids.setdefault(tok.norm_, len(term_ids))
+                                   for tok in sent if not tok.is_punct and not tok.is_stop))
+    if not term_ids: # nothing but punctuation and stopwords
+        return ""
+
+    total = sum(sum(counts.values()) for counts in sent_counts)
+    freqs = [0] * len(term_ids)
+    postings = defaultdict(list) # term id -> sentences containing it, in document order
+    for i, counts in enumerate(sent_counts):
+        for term, count in counts.items():
+            freqs[term] += count
+            postings[term].append(i)
+    probs = [freq / total for freq in freqs]
+    remaining = {term: len(sent_ids) for term, sent_ids in postings.items()} # unpicked sentences containing term
+
+    def score(i):
+        return sum(probs[term] * count for term, count in sent_counts[i].items()) / len(sents[i])
+
+    scores = [score(i) for i in range(len(sents))]
+    picked = [False] * len(sents)
+    # max-heap of words by probability, ties broken by first occurrence; stale entries are skipped when popped
+    heap = [(-prob, term) for term, prob in enumerate(probs)]
+    heapq.heapify(heap)
 
-    sum_count = 0
     summary = []
 
-    while sum_count < sum_length:
-
-        best_sent = None
-        best_weight = 0
-
-        for sent in sents:
-            weight = 0
-            for tok in sent:
-                if not tok.is_punct and not tok.is_stop:
-                    weight += probdict[tok.norm_]
-            weight = weight / len(sent)
-            if weight > best_weight and most_frequent_word in sent.text.lower():
-                best_sent = sent
-                best_weight = weight
-            
-        summary.append(best_sent.text)
-        sum_count += 1
-
-        for tok in best_sent:
-            if not tok.is_punct and not tok.is_stop:
-                probdict[tok.norm_] = probdict[tok.norm_] ** 2
-
-    return " ".join(summary)
\ No newline at end of file
+    while len(summary) < sum_length and heap:
+        neg_prob, term = heap[0]
+        if -neg_prob != probs[term] or remaining[term] == 0:
+            heapq.heappop(heap)
+            continue
+
+        best = max((i for i in postings[term] if not picked[i]), key = lambda i: scores[i])
+        picked[best] = True
+        summary.append(sents[best].text)
+
+        changed = list(sent_counts[best])
+        for term in changed:
+            remaining[term] -= 1
+            probs[term] = probs[term] ** 2
+            heapq.heappush(heap, (-probs[term], term))
+        for i in set(i for term in changed for i in postings[term] if not picked[i]):
+            scores[i] = score(i)
+
+    return " ".join(summary)
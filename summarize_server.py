@@ -0,0 +1,216 @@
+""" Long-lived summarization service.
+
+Loads the spaCy model once and serves summaries from all three summarizers behind a single
+summarize(text, method, n) call. Concurrent requests are collected into micro-batches and
+parsed together with nlp.pipe in an executor thread, off the event loop, and summaries are
+cached by (text hash, method, n). Texts over the model's max_length are rejected before they're
+queued; if a batch still fails to parse, its texts are parsed one at a time, so only the request
+that caused the failure gets the error.
+The service can be used directly from asyncio code or over a local socket speaking
+newline-delimited JSON: {"text": ..., "method": ..., "n": ...} -> {"summary": ...}.
+"""
+
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+
+methods = ["textrank", "sumbasic", "tfidf"]
+
+class SummarizationService(object):
+    """ Micro-batching, caching front end to the summarizers.
+
+    Args:
+        nlp (spacy.language.Language or parsing.Parser): loaded spaCy model, kept for the life of the service;
+            anything with pipe(texts, batch_size) and max_length will do
+        tfidf_model (tfidf_model.TfidfModel): background corpus for the tfidf method (optional)
+        batch_size (int): maximum number of texts parsed together
+        max_wait (float): seconds to wait for more requests before parsing a partial batch
+        cache_size (int): number of summaries to keep
+    """
+
+    def __init__(self, nlp, tfidf_model = None, batch_size = 64, max_wait = 0.01, cache_size = 10000):
+        self.nlp = nlp
+        self.tfidf_model = tfidf_model
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self.cache = OrderedDict() # (text hash, method, n) -> summary, least recently used first
+        self.queue = None
+        self.worker = None
+
+    def summarize_doc(self, doc, method, n):
+        """ Summarize an already parsed document.
+
+        Args:
+            doc (spacy.tokens.doc.Doc): the document
+            method (string): one of "textrank", "sumbasic" or "tfidf"
+            n (int): number of sentences in the summary
+
+        Returns:
+            string: the summary
+        """
+        if method == "textrank":
+            from textrank import summarize
+            return summarize(doc, n)
+        if method == "sumbasic":
+            from sumbasic import sumbasic
+            return sumbasic(doc, n)
+        if method == "tfidf":
+            if self.tfidf_model is None:
+                raise ValueError("tfidf summaries need a background TfidfModel")
+            return self.tfidf_model.summarize(doc, n)
+        raise ValueError("Unknown method: {}".format(method))
+
+    def _cache_get(self, key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        return None
+
+    def _cache_put(self, key, summary):
+        self.cache[key] = summary
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last = False)
+
+    async def summarize(self, text, method = "textrank", n = 1):
+        """ Summarize a text, batching the parse with other concurrent requests.
+
+        Args:
+            text (string): the text to summarize
+            method (string): one of "textrank", "sumbasic" or "tfidf"
+            n (int): number of sentences in the summary
+
+        Returns:
+            string: the summary
+        """
+        if method not in methods:
+            raise ValueError("Unknown method: {}".format(method))
+        if len(text) > self.nlp.max_length:
+            # nlp.pipe would raise for this text, failing the whole batch it was parsed in
+            raise ValueError("Text of length {} exceeds maximum of {}".format(len(text), self.nlp.max_length))
+        key = (hashlib.sha1(text.encode("utf-8")).hexdigest(), method, n)
+        summary = self._cache_get(key)
+        if summary is not None:
+            return summary
+        if self.worker is None:
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.ensure_future(self._run())
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((text, method, n, future))
+        summary = await future
+        self._cache_put(key, summary)
+        return summary
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_event_loop().time() + self.max_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_event_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _process(self, batch):
+        """ Parse and summarize one batch. Runs in an executor thread, so the event loop keeps
+        reading requests meanwhile; results are handed back rather than set on the futures here,
+        since futures must only be resolved from the loop's thread.
+
+        Returns:
+            list of tuples: (summary, None) or (None, exception) for each request in the batch
+        """
+        texts = [text for text, _, _, _ in batch]
+        try:
+            docs = list(self.nlp.pipe(texts, batch_size = len(batch)))
+        except Exception:
+            # one bad text fails the whole batch; parse them one at a time so only its request fails
+            docs = []
+            for text in texts:
+                try:
+                    docs.extend(self.nlp.pipe([text], batch_size = 1))
+                except Exception as e:
+                    docs.append(e)
+        results = []
+        for (text, method, n, _), doc in zip(batch, docs):
+            if isinstance(doc, Exception):
+                results.append((None, doc))
+                continue
+            try:
+                results.append((self.summarize_doc(doc, method, n), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._next_batch()
+            try:
+                results = await loop.run_in_executor(None, self._process, batch)
+            except Exception as e:
+                # the executor itself failed, so no request in the batch has a result;
+                # fail them all and keep serving later batches
+                results = [(None, e)] * len(batch)
+            for (_, _, _, future), (summary, error) in zip(batch, results):
+                if future.done(): # cancelled while the batch was processed
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(summary)
+
+    async def handle(self, reader, writer):
+        """ Serve newline-delimited JSON requests on one connection.
+        """
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line.decode("utf-8"))
+                summary = await self.summarize(request['text'], request.get('method', "textrank"), int(request.get('n', 1)))
+                response = {'summary': summary}
+            except Exception as e:
+                response = {'error': str(e)}
+            writer.write((json.dumps(response) + "\n").encode("utf-8"))
+            await writer.drain()
+        writer.close()
+
+    async def serve(self, host = "127.0.0.1", port = 8765):
+        """ Listen for requests until cancelled.
+
+        Args:
+            host (string): address to listen on
+            port (int): port to listen on
+        """
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+def main():
+    import argparse
+    import textrank, sumbasic, tfidf_summarizer
+    from parsing import Parser
+
+    parser = argparse.ArgumentParser(description = "Serve summaries over a local socket.")
+    parser.add_argument("--model", default = "en_core_web_lg")
+    parser.add_argument("--tfidf-model", help = "directory of a saved TfidfModel, for the tfidf method")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    args = parser.parse_args()
+
+    tfidf = None
+    if args.tfidf_model:
+        from tfidf_model import TfidfModel
+        tfidf = TfidfModel.load(args.tfidf_model)
+    # only run the pipeline components the summarizers read
+    nlp = Parser(args.model, textrank, sumbasic, tfidf_summarizer)
+    service = SummarizationService(nlp, tfidf)
+    asyncio.run(service.serve(args.host, args.port))
+
+if __name__ == "__main__":
+    main()
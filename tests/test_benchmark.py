@@ -0,0 +1,28 @@
+""" Tests for the benchmark measurements and regression checks.
+"""
+import numpy as np
+
+from benchmark import time_target, compare
+
+def test_rss_growth_is_per_target():
+    held = []
+    def allocate(n):
+        held.append(np.ones(n * 2 ** 20 // 8)) # keeps n MB alive
+        return n
+    big = time_target(allocate, [20, 20, 20])
+    small = time_target(lambda n: n + 1, [1, 2, 3])
+    assert big['rss_growth_mb'] > 40
+    assert small['rss_growth_mb'] < 40
+
+def test_compare():
+    before = {'docs_per_sec': 100., 'p50_ms': 1., 'p99_ms': 5., 'rss_growth_mb': 10., 'output_hash': "a"}
+    assert compare({'t/c': dict(before)}, {'t/c': before}) == []
+    slower_tail = dict(before, p99_ms = 7.)
+    assert compare({'t/c': slower_tail}, {'t/c': before}) == ["t/c: p99 7.00 ms, was 5.00"]
+    bigger = dict(before, rss_growth_mb = 40.)
+    assert compare({'t/c': bigger}, {'t/c': before}) == ["t/c: RSS grew 40.0 MB, was 10.0"]
+    # small RSS changes are within the slack
+    assert compare({'t/c': dict(before, rss_growth_mb = 20.)}, {'t/c': before}) == []
+    # baselines recorded before RSS growth was measured
+    old = {k: v for k, v in before.items() if k != 'rss_growth_mb'}
+    assert compare({'t/c': bigger}, {'t/c': old}) == []
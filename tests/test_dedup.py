@@ -0,0 +1,24 @@
+""" Tests for near-duplicate clustering and per-cluster computation.
+"""
+from dedup import NearDuplicateIndex, per_cluster
+
+story = ("The city council voted on Tuesday to approve a new budget for the public schools, "
+         "raising teacher pay and funding repairs to several old buildings across the district.")
+
+def test_near_duplicates_share_a_cluster():
+    index = NearDuplicateIndex(threshold = 0.8)
+    assert index.add("a", story) == "a"
+    assert index.add("b", "Something else entirely happened at the zoo this weekend, officials said.") == "b"
+    assert index.add("c", story + " Read more.") == "a"
+    assert index.report()['duplicates'] == 1
+
+def test_per_cluster_computes_each_cluster_once():
+    calls = []
+    def fn(texts):
+        calls.append(list(texts))
+        return [text.upper() for text in texts]
+    representative = {"a": "a", "b": "b", "c": "a", "d": "x"} # d's representative isn't among the items
+    results = per_cluster(fn, [("a", "one"), ("b", "two"), ("c", "one again"), ("d", "four")], representative)
+    assert calls == [["one", "two", "four"]]
+    assert results == {"a": "ONE", "b": "TWO", "c": "ONE", "d": "FOUR"}
+    assert list(results) == ["a", "b", "c", "d"]
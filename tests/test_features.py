@@ -0,0 +1,72 @@
+""" extract gives the same features in worker processes as in this one, and the same values
+as calling the dimension functions directly.
+"""
+import random
+
+import spacy
+from spacy.tokens import Doc
+
+from features import extract
+from dimensions import leads_with_question, has_det, num_named_entities, accusatory, has_superlative
+from listicles import is_listicle
+
+vocab = spacy.blank("en").vocab
+
+def hand_parsed_title(rng):
+    """ A random title of the form [lead] [det] [adj] noun verb [det] noun [punct], with a
+        parse, part-of-speech tags, lemmas and entities filled in by hand.
+    """
+    tokens = [] # (word, lemma, pos, dep, head)
+    lead = rng.choice([None, ("Why", "why", "ADV", "advmod"), ("10", "10", "NUM", "nummod")])
+    if lead:
+        tokens.append(lead + ("verb",))
+    for dep in ("nsubj", "dobj"):
+        if rng.random() < 0.5:
+            det = rng.choice(["the", "a", "these"])
+            tokens.append((det, det, "DET", "det", dep))
+        if rng.random() < 0.4:
+            adj, lemma = rng.choice([("best", "good"), ("fastest", "fast"), ("biggest", "big"), ("honest", "honest")])
+            tokens.append((adj, lemma, "ADJ", "amod", dep))
+        noun, pos = rng.choice([("cat", "NOUN"), ("city", "NOUN"), ("Obama", "PROPN"), ("you", "PRON"), ("things", "NOUN")])
+        tokens.append((noun, noun.lower(), pos, dep, "verb"))
+        if dep == "nsubj":
+            verb = rng.choice(["shocked", "loves", "ranked"])
+            tokens.append((verb, verb, "VERB", "ROOT", "verb"))
+    if rng.random() < 0.5:
+        tokens.append(("?", "?", "PUNCT", "punct", "verb"))
+
+    # heads name the token they attach to: the verb, or the next noun with the given dep
+    def head_of(i, head):
+        for j, (_, _, _, dep, _) in enumerate(tokens):
+            if (head == "verb" and dep == "ROOT") or (head != "verb" and dep == head and j > i):
+                return j
+    words = [tok[0] for tok in tokens]
+    ents = ["B-PERSON" if word == "Obama" else "O" for word in words]
+    return Doc(vocab, words = words, lemmas = [tok[1] for tok in tokens], pos = [tok[2] for tok in tokens],
+               deps = [tok[3] for tok in tokens], heads = [head_of(i, tok[4]) for i, tok in enumerate(tokens)],
+               ents = ents)
+
+def hand_parsed_titles(num, seed = 0):
+    rng = random.Random(seed)
+    return [hand_parsed_title(rng) for _ in range(num)]
+
+names = ["listicle", "leadsWithQuestion", "hasDeterminer", "numNamedEntities", "accusatory", "superlative"]
+
+def test_matches_dimension_functions():
+    docs = hand_parsed_titles(200)
+    features = extract(docs, names)
+    for name, fn in zip(names, [is_listicle, leads_with_question, has_det, num_named_entities, accusatory, has_superlative]):
+        assert list(features[name]) == [fn(doc) for doc in docs], name
+    # the titles exercise both values of every boolean feature
+    for name in ["leadsWithQuestion", "hasDeterminer", "accusatory", "superlative"]:
+        assert 0 < features[name].sum() < len(docs), name
+    assert features["numNamedEntities"].max() > 0
+
+def test_workers_match_serial():
+    docs = hand_parsed_titles(100)
+    serial = extract(docs, names)
+    parallel = extract(iter(docs), names, workers = 2, chunksize = 7)
+    assert list(parallel) == list(serial)
+    for name in names:
+        assert parallel[name].dtype == serial[name].dtype, name
+        assert list(parallel[name]) == list(serial[name]), name
@@ -0,0 +1,89 @@
+""" scan_listicle makes the same decisions as the original is_listicle.
+"""
+import random
+
+import spacy
+from spacy.tokens import Doc
+
+from listicles import is_listicle, is_small_number, get_lowered_tokens
+
+vocab = spacy.blank("en").vocab
+
+def reference_is_listicle(doc):
+    """ The original is_listicle, kept to check the single-scan version against.
+    """
+    for sent in doc.sents:
+        if is_small_number(sent[0]):
+            ltoks = get_lowered_tokens(doc)
+            flag_words = ["police", "dead", "shot", "killed", "injured"]
+            try:
+                if sent[1].lower_ != "minutes" and \
+                    sent[1].lower_ != "percent" and \
+                    sent[1].lower_ != "hours" and \
+                    not sent[1].is_punct and \
+                    not any([word in ltoks for word in flag_words]):
+                    return True
+            except IndexError:
+                pass
+    for i, tok in enumerate(doc):
+        if tok.lower_ == "top" or tok.lower_ == "these" or tok.lower_ == "the":
+            try:
+                if is_small_number(doc[i + 1]):
+                    return True
+            except IndexError:
+                pass
+        elif tok.lower_ == "list" or tok.lower_ == "ranked":
+            return True
+        elif is_small_number(tok):
+            try:
+                if doc[i + 1].lower_ == 'things':
+                    return True
+            except IndexError:
+                pass
+    return False
+
+def make_doc(sents):
+    words = [word for sent in sents for word in sent]
+    sent_starts = [i == 0 for sent in sents for i in range(len(sent))]
+    return Doc(vocab, words = words, sent_starts = sent_starts)
+
+edge_cases = [
+    [["Stocks", "fell", "today"], ["10"]], # sentence-initial number at the end of the doc
+    [["10"]],
+    [["5", "people", "shot", "downtown"]], # flag word
+    [["5", "Dead", "after", "crash"]], # flag word, any case
+    [["Police", "say"], ["5", "suspects", "fled"]], # flag word in another sentence
+    [["5", "minutes", "of", "fame"]],
+    [["20", "percent", "off"]],
+    [["3", ":", "the", "sequel"]],
+    [["Meet", "the", "top"]], # "top" at the last token
+    [["Who", "is", "the"]], # "the" at the last token
+    [["See", "the", "5"]],
+    [["The", "top", "5000", "songs"]], # not a small number
+    [["Ranked", ":", "every", "film"]],
+    [["Things", "to", "do"]],
+    [["7", "things", "to", "do"]],
+    [["Do", "these", "7"]],
+    [["Nothing", "to", "see", "here"]],
+    [["The", "2", "best"], ["3"]],
+]
+
+def test_edge_cases():
+    for sents in edge_cases:
+        doc = make_doc(sents)
+        assert is_listicle(doc) == reference_is_listicle(doc), sents
+
+words = ["10", "5", "1000", "1001", "7", "top", "these", "the", "The", "list", "ranked", "things", "Things",
+         "minutes", "percent", "hours", "police", "dead", "shot", "killed", "injured", ",", ".", "!", ":",
+         "you", "best", "city", "why", "ways", "people", "cats", "never", "believe"]
+
+def test_random_titles():
+    rng = random.Random(0)
+    listicles = 0
+    for _ in range(5000):
+        sents = [[rng.choice(words) for _ in range(rng.randint(1, 6))] for _ in range(rng.randint(1, 3))]
+        doc = make_doc(sents)
+        decision = is_listicle(doc)
+        assert decision == reference_is_listicle(doc), sents
+        listicles += decision
+    assert 0 < listicles < 5000
@@ -0,0 +1,63 @@
+""" Tests for the streaming corpus loader.
+"""
+import json
+
+import pandas as pd
+
+from dedup import NearDuplicateIndex
+from loader import write_corpus, read_corpus, corpus_columns, read_clusters
+
+def write_jsonl(path, objs):
+    with open(path, "w") as f:
+        for obj in objs:
+            f.write(json.dumps(obj) + "\n")
+
+def make_corpus(tmp_path, num = 57):
+    instances = [{'id': str(i),
+                  'postText': ["Post  number {}".format(i)],
+                  'targetKeywords': "news, story {}".format(i),
+                  'targetParagraphs': ["Paragraph one of {}.".format(i), "Read more", "Sign up"],
+                  'targetTitle': "You won't believe  story {} The list".format(i)}
+                 for i in range(num)]
+    truth = [{'id': str(i), 'truthJudgments': [0.0, 1.0], 'truthMean': 0.5, 'truthMedian': 0.5,
+              'truthMode': 0.0, 'truthClass': "clickbait" if i % 2 else "no-clickbait"}
+             for i in range(num) if i % 5] # some instances have no labels
+    write_jsonl(tmp_path / "instances.jsonl", instances)
+    write_jsonl(tmp_path / "truth.jsonl", truth)
+
+def test_parallel_matches_serial(tmp_path):
+    make_corpus(tmp_path)
+    instances, truth = str(tmp_path / "instances.jsonl"), str(tmp_path / "truth.jsonl")
+    assert write_corpus(instances, truth, str(tmp_path / "serial"), batch_size = 20) == 57
+    assert write_corpus(instances, truth, str(tmp_path / "parallel"), batch_size = 20, workers = 2, chunksize = 3) == 57
+
+    serial = read_corpus(str(tmp_path / "serial"))
+    parallel = read_corpus(str(tmp_path / "parallel"))
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert list(serial.index) == [str(i) for i in range(57)]
+    assert serial.loc['3', 'targetParagraphs'] == "Paragraph one of 3."
+    assert serial.loc['3', 'targetTitle'] == "You won't believe story 3"
+    # batch_size still decides the parquet files, whatever the cleaning shard size
+    assert len(list((tmp_path / "parallel").iterdir())) == 3
+
+def test_corpus_columns(tmp_path):
+    make_corpus(tmp_path, num = 5)
+    write_corpus(str(tmp_path / "instances.jsonl"), str(tmp_path / "truth.jsonl"), str(tmp_path / "corpus"))
+    columns = corpus_columns(str(tmp_path / "corpus"))
+    assert columns == list(read_corpus(str(tmp_path / "corpus")).columns)
+    assert 'clusterId' not in columns # only written with a dedup index
+
+def test_read_clusters(tmp_path):
+    make_corpus(tmp_path, num = 12)
+    instances, truth = str(tmp_path / "instances.jsonl"), str(tmp_path / "truth.jsonl")
+    write_corpus(instances, truth, str(tmp_path / "plain"))
+    # without a dedup index, every article is its own cluster
+    df = read_clusters(str(tmp_path / "plain"), ['targetTitle'])
+    assert list(df.columns) == ['targetTitle', 'clusterId']
+    assert list(df['clusterId']) == list(df.index)
+    assert list(read_clusters(str(tmp_path / "plain")).columns) == ['clusterId']
+
+    write_corpus(instances, truth, str(tmp_path / "dedup"), dedup = NearDuplicateIndex())
+    df = read_clusters(str(tmp_path / "dedup"), ['targetTitle'])
+    assert list(df.columns) == ['targetTitle', 'clusterId']
+    pd.testing.assert_series_equal(df['clusterId'], read_corpus(str(tmp_path / "dedup"))['clusterId'])
@@ -0,0 +1,49 @@
+""" Matching a corpus in worker processes gives the same records as matching it serially.
+"""
+import json
+
+import spacy
+
+from match_corpus import match_corpus, _chunks, group_by_article
+from test_merged_tokens import hand_parsed_article, hand_parsed_title
+
+vocab = spacy.blank("en").vocab
+
+def read_matches(path):
+    with open(path, "r") as f:
+        return [(record['id'], record['matches']) for record in map(json.loads, f)]
+
+def make_pairs(num = 10):
+    # every other title points at the same article, as near-duplicates share their representative's key
+    shared = hand_parsed_article(vocab)
+    pairs = []
+    for i in range(num):
+        if i % 2:
+            pairs.append((str(i), hand_parsed_title(vocab), shared, "shared"))
+        else:
+            pairs.append((str(i), hand_parsed_title(vocab), hand_parsed_article(vocab), str(i)))
+    return pairs
+
+def test_articles_listed_once_per_chunk():
+    chunks = list(_chunks(make_pairs(), 4, done = {"2"}))
+    assert [ids for ids, _, _, _ in chunks] == [["0", "1", "3", "4"], ["5", "6", "7", "8"], ["9"]]
+    ids, titles, articles, article_of = chunks[0]
+    assert len(articles) == 3 # "0", "shared", "4"
+    assert article_of == [0, 1, 1, 2]
+
+def test_parallel_matches_serial(tmp_path):
+    serial, parallel = str(tmp_path / "serial.jsonl"), str(tmp_path / "parallel.jsonl")
+    assert match_corpus(make_pairs(), serial, chunksize = 3) == 10
+    assert match_corpus(make_pairs(), parallel, workers = 2, chunksize = 3) == 10
+    assert read_matches(serial) == read_matches(parallel)
+    assert read_matches(serial)[0] == ("0", {"Mayor": ["Barack Obama"]})
+    # a finished run is skipped when resumed
+    assert match_corpus(make_pairs(), serial) == 0
+
+def test_group_by_article():
+    # near-duplicates ("3", "4") are added after all the representatives
+    keys = {"0": "a", "1": "b", "2": "c", "3": "a", "4": "b"}
+    ids = group_by_article(["0", "1", "2", "3", "4"], keys)
+    assert ids == ["0", "3", "1", "4", "2"]
+    pairs = [(id, None, keys[id], keys[id]) for id in ids]
+    assert [articles for _, _, articles, _ in _chunks(pairs, 2, done = set())] == [["a"], ["b"], ["c"]]
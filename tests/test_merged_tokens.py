@@ -0,0 +1,104 @@
+""" MergedTokens gives the same matches as retokenizing a copy of the article, and the
+article index built from it is cached without touching the document.
+"""
+import pytest
+import spacy
+from spacy.tokens import Doc, DocBin
+
+from match_title_ents import retokenize_ents, MergedTokens, ArticleIndex, article_index, match_title_ents
+
+def reference_match_title_ents(title, doc):
+    """ The original match_title_ents, which retokenizes a copy of the article, kept to check against.
+    """
+    doc_lemmas = [tok.lemma_.lower() for tok in doc]
+    retok = Doc(doc.vocab).from_bytes(doc.to_bytes())
+    mapping = retokenize_ents(retok)
+    matched = {}
+    for chunk in title.noun_chunks:
+        target_root = chunk.root
+        for sent in doc.sents:
+            sent_lemmas = doc_lemmas[sent.start:sent.end]
+            if target_root.lemma_ in sent_lemmas:
+                idx = doc_lemmas.index(target_root.lemma_, sent.start, sent.end)
+                if idx in mapping:
+                    pos = mapping[idx]
+                    target_phrase = retok[pos]
+                    match = None
+                else:
+                    match = "?"
+                while not match:
+                    if target_phrase.ent_type:
+                        match = target_phrase
+                        if chunk.text in matched:
+                            matched[chunk.text].append(match.text)
+                        else:
+                            matched[chunk.text] = [match.text]
+                    elif target_phrase.dep_ == "ROOT":
+                        match = "?"
+                    else:
+                        target_phrase = target_phrase.head
+    return matched
+
+def check_merged(doc):
+    """ Compare every field of MergedTokens with the retokenized copy it stands in for.
+    """
+    merged = MergedTokens(doc)
+    retok = Doc(doc.vocab).from_bytes(doc.to_bytes())
+    mapping = retokenize_ents(retok)
+    assert merged.mapping == mapping
+    assert merged.text == [tok.text for tok in retok]
+    assert merged.has_ent == [bool(tok.ent_type) for tok in retok]
+    assert merged.is_root == [tok.dep_ == "ROOT" for tok in retok]
+    assert merged.head == [tok.head.i for tok in retok]
+
+def hand_parsed_article(vocab):
+    """ "Barack Obama, the mayor, praised Boston. The city loved the mayor."
+    """
+    words = ["Barack", "Obama", ",", "the", "mayor", ",", "praised", "Boston", ".",
+             "The", "city", "loved", "the", "mayor", "."]
+    heads = [1, 6, 1, 4, 1, 1, 6, 6, 6, 10, 11, 11, 13, 11, 11]
+    deps = ["compound", "nsubj", "punct", "det", "appos", "punct", "ROOT", "dobj", "punct",
+            "det", "nsubj", "ROOT", "det", "dobj", "punct"]
+    pos = ["PROPN", "PROPN", "PUNCT", "DET", "NOUN", "PUNCT", "VERB", "PROPN", "PUNCT",
+           "DET", "NOUN", "VERB", "DET", "NOUN", "PUNCT"]
+    ents = ["B-PERSON", "I-PERSON", "O", "O", "O", "O", "O", "B-GPE", "O", "O", "O", "O", "O", "O", "O"]
+    return Doc(vocab, words = words, heads = heads, deps = deps, pos = pos, ents = ents,
+               lemmas = [word.lower() for word in words])
+
+def hand_parsed_title(vocab):
+    return Doc(vocab, words = ["Mayor", "praised"], heads = [1, 1], deps = ["nsubj", "ROOT"],
+               pos = ["NOUN", "VERB"], lemmas = ["mayor", "praise"])
+
+def test_hand_parsed_doc():
+    vocab = spacy.blank("en").vocab
+    doc = hand_parsed_article(vocab)
+    check_merged(doc)
+    title = hand_parsed_title(vocab)
+    matches = match_title_ents(title, doc, index = ArticleIndex(doc))
+    assert matches == reference_match_title_ents(title, doc)
+    assert matches == {"Mayor": ["Barack Obama"]}
+
+def test_data():
+    try:
+        nlp = spacy.load('en_core_web_sm')
+    except OSError:
+        pytest.skip("en_core_web_sm is not installed")
+    for n in (1, 2):
+        with open("tests/test_data/title{}.txt".format(n), "r") as text_file:
+            title = nlp(text_file.read())
+        with open("tests/test_data/article{}.txt".format(n), "r") as text_file:
+            article = nlp(text_file.read())
+        check_merged(article)
+        assert match_title_ents(title, article, index = ArticleIndex(article)) == reference_match_title_ents(title, article)
+
+def test_article_index_leaves_doc_serializable():
+    vocab = spacy.blank("en").vocab
+    doc = hand_parsed_article(vocab)
+    match_title_ents(hand_parsed_title(vocab), doc)
+    assert article_index(doc) is article_index(doc) # built once, then reused
+    assert not doc.user_data
+    restored = Doc(vocab).from_bytes(doc.to_bytes())
+    assert [tok.text for tok in restored] == [tok.text for tok in doc]
+    docbin = DocBin(store_user_data = True)
+    docbin.add(doc)
+    assert len(list(DocBin().from_bytes(docbin.to_bytes()).get_docs(vocab))) == 1
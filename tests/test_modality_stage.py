@@ -0,0 +1,102 @@
+""" run_modality retries failed titles with backoff, skips titles already in the store, and
+recovers when a worker process dies. title_modality is replaced, so pattern isn't needed.
+"""
+import os
+import sqlite3
+
+import modality_stage
+from modality_stage import ModalityStore, run_modality
+
+items = [("a", "First title"), ("b", "Second title"), ("c", "Third title")]
+
+def fake_modality(text):
+    return len(text) / 100.
+
+class Flaky(object):
+    """ Fails the first few calls for some titles, and records every call.
+    """
+
+    def __init__(self, failures):
+        self.failures = dict(failures)
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        if self.failures.get(text, 0) > 0:
+            self.failures[text] -= 1
+            raise RuntimeError("pattern failed")
+        return fake_modality(text)
+
+def expected(items):
+    return {id: fake_modality(text) for id, text in items}
+
+def test_retries_with_backoff(tmp_path, monkeypatch):
+    flaky = Flaky({"Second title": 2})
+    sleeps = []
+    monkeypatch.setattr(modality_stage, "title_modality", flaky)
+    monkeypatch.setattr(modality_stage.time, "sleep", sleeps.append)
+    results = run_modality(items, str(tmp_path / "modality.sqlite"), retries = 5, backoff = 0.5)
+    assert results == expected(items)
+    assert sleeps == [0.5, 1.0]
+    assert flaky.calls.count("First title") == 1
+    assert flaky.calls.count("Second title") == 3
+
+def test_gives_up_after_retries(tmp_path, monkeypatch):
+    flaky = Flaky({"Second title": 10})
+    sleeps = []
+    monkeypatch.setattr(modality_stage, "title_modality", flaky)
+    monkeypatch.setattr(modality_stage.time, "sleep", sleeps.append)
+    results = run_modality(items, str(tmp_path / "modality.sqlite"), retries = 3, backoff = 0.5)
+    assert results == expected([items[0], items[2]])
+    assert sleeps == [0.5, 1.0, 2.0]
+    assert flaky.calls.count("Second title") == 4
+
+def test_rerun_skips_stored(tmp_path, monkeypatch):
+    path = str(tmp_path / "modality.sqlite")
+    monkeypatch.setattr(modality_stage, "title_modality", Flaky({"Second title": 10}))
+    monkeypatch.setattr(modality_stage.time, "sleep", lambda seconds: None)
+    run_modality(items, path, retries = 0)
+
+    flaky = Flaky({})
+    monkeypatch.setattr(modality_stage, "title_modality", flaky)
+    more = items + [("d", "Fourth title")]
+    assert run_modality(more, path) == expected(more)
+    assert flaky.calls == ["Second title", "Fourth title"]
+
+def crash_once(text):
+    # runs in a worker process: the first time it sees the crashing title, the worker dies
+    marker = os.environ["MODALITY_CRASH_MARKER"]
+    if text == "Second title" and not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return fake_modality(text)
+
+def test_recovers_from_broken_pool(tmp_path, monkeypatch):
+    sleeps = []
+    monkeypatch.setenv("MODALITY_CRASH_MARKER", str(tmp_path / "crashed"))
+    monkeypatch.setattr(modality_stage, "title_modality", crash_once)
+    monkeypatch.setattr(modality_stage.time, "sleep", sleeps.append)
+    results = run_modality(items, str(tmp_path / "modality.sqlite"), retries = 2, backoff = 0.5, workers = 2)
+    assert os.path.exists(str(tmp_path / "crashed"))
+    assert results == expected(items)
+    assert sleeps == [0.5]
+
+def stored(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM modality").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_put_commits_in_batches(tmp_path):
+    path = str(tmp_path / "modality.sqlite")
+    store = ModalityStore(path, commit_every = 3)
+    store.put("a", 0.1)
+    store.put("b", 0.2)
+    assert stored(path) == 0
+    assert store.done() == {"a", "b"} # visible to the store before they're committed
+    store.put("c", 0.3)
+    assert stored(path) == 3
+    store.put("d", 0.4)
+    store.close()
+    assert stored(path) == 4
@@ -0,0 +1,48 @@
+""" Tests for the pruned parsing service.
+"""
+import spacy
+from spacy.training import Example
+
+from parsing import Parser
+from doc_cache import docs_to_bytes, docs_from_bytes, model_key
+
+def small_model():
+    # a tiny untrained pipeline laid out like a v3 model, with the senter disabled
+    nlp = spacy.blank("en")
+    nlp.add_pipe("tok2vec")
+    nlp.add_pipe("parser")
+    nlp.add_pipe("senter")
+    doc = nlp.make_doc("A cat sat . It ran .")
+    example = Example.from_dict(doc, {'heads': [1, 2, 2, 2, 5, 5, 5],
+                                      'deps': ['det', 'nsubj', 'ROOT', 'punct', 'nsubj', 'ROOT', 'punct']})
+    nlp.initialize(lambda: [example])
+    nlp.disable_pipe("senter")
+    return nlp
+
+nlp = small_model()
+
+def test_sents_use_senter_without_dep():
+    parser = Parser(nlp, {"sents", "is_punct"})
+    assert "parser" not in parser.pipes
+    assert parser.pipes[-1] == "senter"
+    doc = parser("A cat sat. It ran.")
+    assert doc.has_annotation("SENT_START")
+    assert not doc.has_annotation("DEP")
+    # the shared model is left as it was
+    assert "senter" not in nlp.pipe_names
+
+def test_dep_keeps_parser():
+    parser = Parser(nlp, {"sents", "dep"})
+    assert parser.pipes == ["tok2vec", "parser"]
+    assert parser("A cat sat.").has_annotation("DEP")
+
+def test_model_key_includes_pipes():
+    pruned = Parser(nlp, {"sents"})
+    full = Parser(nlp, {"sents", "dep"})
+    assert model_key(pruned) != model_key(full)
+    assert model_key(nlp) != model_key(pruned)
+
+def test_senter_boundaries_survive_serialization():
+    doc = Parser(nlp, {"sents"})("A cat sat. It ran.")
+    restored = docs_from_bytes(docs_to_bytes([doc]), nlp.vocab)[0]
+    assert [sent.text for sent in restored.sents] == [sent.text for sent in doc.sents]
@@ -0,0 +1,59 @@
+""" Tests for the running grouped means and correlations.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+import stats
+from stats import RunningStats
+
+def feature_frame(num = 200, seed = 0):
+    # laid out like the frame dimensions.main writes to Results/dim_features.parquet
+    rng = np.random.RandomState(seed)
+    truth = rng.rand(num)
+    df = pd.DataFrame({'truthMean': truth, 'truthMedian': np.round(truth * 3) / 3, 'truthMode': truth,
+                       'truthClass': np.where(truth > 0.5, "clickbait", "no-clickbait")},
+                      index = pd.Index([str(i) for i in range(num)], name = 'id'))
+    for name in stats.dimensions:
+        df[name] = truth + rng.rand(num)
+    df.loc[df.index[:5], 'polarity'] = np.nan
+    return df
+
+def test_batches_match_whole_frame():
+    df = feature_frame()
+    whole = RunningStats().update(df)
+    batched = RunningStats().update(df.iloc[:70]).update(df.iloc[70:])
+    pd.testing.assert_frame_equal(whole.means(), batched.means())
+    assert np.allclose(whole.correlations()['r'], batched.correlations()['r'])
+    expected = df.groupby('truthClass')[stats.dimensions].mean()
+    assert np.allclose(whole.means().loc[expected.index].values, expected.values)
+    present = df[['polarity', 'truthMean']].dropna()
+    r = whole.correlations().set_index(['dimension', 'target']).loc[('polarity', 'truthMean'), 'r']
+    assert np.isclose(r, np.corrcoef(present['polarity'], present['truthMean'])[0, 1])
+
+def test_unlabelled_rows():
+    # as read from a corpus where some instances have no truth labels (see loader.join_truth)
+    df = feature_frame()
+    unlabelled = df.index[::5]
+    df['truthClass'] = df['truthClass'].astype(object)
+    df.loc[unlabelled, ['truthMean', 'truthMedian', 'truthMode', 'truthClass']] = None
+    summary = RunningStats().update(df.iloc[:70]).update(df.iloc[70:])
+    labelled = df.drop(unlabelled)
+    expected = labelled.groupby('truthClass')[stats.dimensions].mean()
+    assert list(summary.means().index) == list(expected.index)
+    assert np.allclose(summary.means().values, expected.values)
+    pd.testing.assert_frame_equal(summary.correlations(), RunningStats().update(labelled).correlations())
+
+def test_main_reads_stage_output(tmp_path, monkeypatch):
+    df = feature_frame()
+    df.iloc[:100].to_parquet(tmp_path / "first.parquet")
+    df.iloc[100:].to_parquet(tmp_path / "second.parquet")
+    out = str(tmp_path / "dim")
+    monkeypatch.setattr(sys, "argv", ["stats.py", str(tmp_path / "first.parquet"), "--out", out])
+    stats.main()
+    # a later batch is folded into the saved state
+    monkeypatch.setattr(sys, "argv", ["stats.py", str(tmp_path / "second.parquet"), "--out", out])
+    stats.main()
+    means = pd.read_csv(out + "_means.csv", index_col = 0)
+    assert np.allclose(means.values, RunningStats().update(df).means().values)
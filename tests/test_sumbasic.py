@@ -0,0 +1,118 @@
+""" sumbasic picks sentences in the order of the SumBasic algorithm, and handles the documents
+the original implementation failed on.
+"""
+import operator
+import random
+from collections import Counter
+
+import pytest
+import spacy
+from spacy.tokens import Doc
+
+from sumbasic import sumbasic
+
+vocab = spacy.blank("en").vocab
+
+def original_sumbasic(doc, sum_length = 1):
+    """ The original sumbasic, kept to show the documents it failed on.
+    """
+    tokens = [tok.norm_ for tok in doc if not tok.is_punct and not tok.is_stop]
+    freqdist = Counter(tokens)
+    probs = [freqdist[key] / len(tokens) for key in freqdist]
+    probdict = dict(zip(freqdist.keys(), probs))
+    sents = list(doc.sents)
+    most_frequent_word = max(probdict.items(), key = operator.itemgetter(1))[0]
+
+    sum_count = 0
+    summary = []
+
+    while sum_count < sum_length:
+
+        best_sent = None
+        best_weight = 0
+
+        for sent in sents:
+            weight = 0
+            for tok in sent:
+                if not tok.is_punct and not tok.is_stop:
+                    weight += probdict[tok.norm_]
+            weight = weight / len(sent)
+            if weight > best_weight and most_frequent_word in sent.text.lower():
+                best_sent = sent
+                best_weight = weight
+
+        summary.append(best_sent.text)
+        sum_count += 1
+
+        for tok in best_sent:
+            if not tok.is_punct and not tok.is_stop:
+                probdict[tok.norm_] = probdict[tok.norm_] ** 2
+
+    return " ".join(summary)
+
+def reference_sumbasic(doc, sum_length = 1):
+    """ SumBasic written out directly: after every pick, take the most probable word that is still
+        in an unpicked sentence, pick the best unpicked sentence containing it, then square the
+        probability of each distinct word in that sentence once.
+    """
+    sents = list(doc.sents)
+    sent_terms = [Counter(tok.norm_ for tok in sent if not tok.is_punct and not tok.is_stop) for sent in sents]
+    counts = sum(sent_terms, Counter())
+    if not counts:
+        return ""
+    total = sum(counts.values())
+    probs = {term: count / total for term, count in counts.items()} # in order of first occurrence
+    picked = []
+    while len(picked) < sum_length:
+        words = [term for term in probs if any(term in sent_terms[i] for i in range(len(sents)) if i not in picked)]
+        if not words:
+            break
+        word = max(words, key = lambda term: probs[term]) # first occurrence wins ties
+        candidates = [i for i in range(len(sents)) if i not in picked and word in sent_terms[i]]
+        best = max(candidates, key = lambda i: sum(probs[term] * count for term, count in sent_terms[i].items()) / len(sents[i]))
+        picked.append(best)
+        for term in sent_terms[best]:
+            probs[term] = probs[term] ** 2
+    return " ".join(sents[i].text for i in picked)
+
+def make_doc(sents):
+    words = [word for sent in sents for word in sent]
+    sent_starts = [i == 0 for sent in sents for i in range(len(sent))]
+    return Doc(vocab, words = words, sent_starts = sent_starts)
+
+def test_no_content_words():
+    doc = make_doc([["The", "and", "."], ["It", "was", "!"]])
+    with pytest.raises(ValueError):
+        original_sumbasic(doc)
+    assert sumbasic(doc) == ""
+    assert sumbasic(make_doc([["."]])) == ""
+
+def test_pick_order():
+    doc = make_doc([["cats", "chase", "mice", "."],
+                    ["cats", "sleep", "."],
+                    ["dogs", "chase", "cats", "."],
+                    ["mice", "sleep", "."]])
+    # cats, then sleep (the top word once cats is squared), then dogs, then mice: every sentence once
+    expected = ["cats chase mice .", "cats sleep .", "dogs chase cats .", "mice sleep ."]
+    assert sumbasic(doc, 4) == " ".join(expected)
+    # the original keeps using cats, and picks the second sentence again
+    assert original_sumbasic(doc, 4).count("cats sleep .") == 2
+    # asking for more sentences than there are gives each one once
+    assert sumbasic(doc, 10) == sumbasic(doc, 4)
+
+def test_repeated_word_squared_once():
+    doc = make_doc([["rain", "rain", "falls", "."],
+                    ["rain", "stops", "."],
+                    ["sun", "falls", "."],
+                    ["sun", "shines", "."]])
+    assert sumbasic(doc, 3) == reference_sumbasic(doc, 3)
+
+words = ["cats", "dogs", "mice", "chase", "sleep", "rain", "sun", "city", "vote", "the", "a", "and", "it", ",", "!"]
+
+def test_random_docs():
+    rng = random.Random(0)
+    for _ in range(500):
+        sents = [[rng.choice(words) for _ in range(rng.randint(1, 6))] + ["."] for _ in range(rng.randint(1, 6))]
+        doc = make_doc(sents)
+        for sum_length in (1, 2, 3, 8):
+            assert sumbasic(doc, sum_length) == reference_sumbasic(doc, sum_length), sents
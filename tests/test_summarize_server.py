@@ -0,0 +1,78 @@
+""" The summarization service batches concurrent requests and survives failed batches.
+"""
+import asyncio
+
+import pytest
+import spacy
+
+from summarize_server import SummarizationService
+from textrank import summarize
+
+class RecordingModel(object):
+    """ A small model that records the size of each batch it parses, and fails any batch
+    containing a poisoned text.
+    """
+
+    def __init__(self):
+        self.nlp = spacy.blank("en")
+        self.nlp.add_pipe("sentencizer")
+        self.nlp.max_length = 500
+        self.max_length = self.nlp.max_length
+        self.batches = []
+
+    def pipe(self, texts, batch_size = 256):
+        self.batches.append(len(texts))
+        if any(text == poisoned for text in texts):
+            raise ValueError("can't parse this batch")
+        return self.nlp.pipe(texts, batch_size = batch_size)
+
+texts = ["The cat sat on the mat. The dog sat on the cat. Birds sang {} times.".format(i) for i in range(10)]
+too_long = "Words. " * 100 # over max_length, so nlp.pipe would raise E088
+poisoned = "This text fails the batch it's parsed in."
+
+def test_concurrent_requests_are_batched():
+    model = RecordingModel()
+    service = SummarizationService(model, max_wait = 0.05)
+
+    async def run():
+        return await asyncio.gather(*[service.summarize(text, "textrank", 1) for text in texts])
+
+    summaries = asyncio.run(run())
+    assert summaries == [summarize(model.nlp(text), 1) for text in texts]
+    assert max(model.batches) > 1
+
+def test_too_long_rejected_before_batching():
+    model = RecordingModel()
+    service = SummarizationService(model, max_wait = 0.05)
+
+    async def run():
+        return await asyncio.gather(service.summarize(texts[0]), service.summarize(too_long), return_exceptions = True)
+
+    summary, error = asyncio.run(run())
+    assert summary == summarize(model.nlp(texts[0]), 1)
+    assert isinstance(error, ValueError)
+    assert model.batches == [1] # the long text never reached the model
+
+def test_failed_batch_fails_its_requests_only():
+    model = RecordingModel()
+    service = SummarizationService(model, max_wait = 0.05)
+
+    async def run():
+        results = await asyncio.gather(service.summarize(texts[0]), service.summarize(poisoned),
+                                       service.summarize(texts[2]), return_exceptions = True)
+        # the worker is still running, so later requests are served
+        later = await asyncio.wait_for(service.summarize(texts[1]), 5)
+        return results, later
+
+    (first, failed, third), later = asyncio.run(run())
+    assert first == summarize(model.nlp(texts[0]), 1)
+    assert third == summarize(model.nlp(texts[2]), 1)
+    assert isinstance(failed, ValueError)
+    assert later == summarize(model.nlp(texts[1]), 1)
+    # the failed batch of 3 was parsed again one text at a time
+    assert model.batches == [3, 1, 1, 1, 1]
+
+def test_unknown_method():
+    service = SummarizationService(RecordingModel())
+    with pytest.raises(ValueError):
+        asyncio.run(service.summarize(texts[0], "lexrank"))
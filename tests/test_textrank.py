@@ -0,0 +1,98 @@
+""" Tests for TextRank: the sparse path ranks sentences the same as the original dense one,
+the power method's convergence report and warm start, and tracing of the code that runs.
+"""
+import numpy as np
+import pytest
+import spacy
+from spacy.tokens import Doc
+
+from textrank import get_edge_weights, power_method, epsilon, damping, sentence_lemma_ids, incidence_matrix, sparse_edge_weights, pagerank
+from textrank import rate_sentences, rate_sentences_with_report, warm_start, Convergence, check_convergence, summarize_many, summarize
+from tracing import tracer
+
+vocab = spacy.blank("en").vocab
+
+def make_doc(sents):
+    """ Build a document from a list of sentences (lists of words); lemmas are the lower-cased words.
+    """
+    words = [word for sent in sents for word in sent]
+    sent_starts = [i == 0 for sent in sents for i in range(len(sent))]
+    return Doc(vocab, words = words, sent_starts = sent_starts, lemmas = [word.lower() for word in words])
+
+docs = {
+    'plain': [["The", "cat", "sat", "on", "the", "mat", "."],
+              ["A", "dog", "chased", "the", "cat", "."],
+              ["The", "dog", "slept", "on", "a", "mat", "."],
+              ["Birds", "sing", "."]],
+    'stop_words_only': [["The", "cat", "sat", "."],
+                        ["It", "was", "there", "."],
+                        ["The", "cat", "ran", "."],
+                        ["And", "then", "."]],
+    'single_sentence': [["The", "cat", "sat", "on", "the", "mat", "."]],
+    'single_word': [["Cats", "!"]],
+    'all_empty': [["It", "was", "."], ["And", "then", "."]],
+    'one_word_sentences': [["Cats", "."], ["Cats", "."], ["Dogs", "."]],
+}
+
+def dense_ranks(doc):
+    return power_method(get_edge_weights(doc), epsilon)
+
+def sparse_ranks(doc):
+    ranks, _ = pagerank(sparse_edge_weights(incidence_matrix(*sentence_lemma_ids(doc))))
+    return ranks
+
+def test_sparse_weights_match_dense():
+    for name, sents in docs.items():
+        doc = make_doc(sents)
+        sparse = sparse_edge_weights(incidence_matrix(*sentence_lemma_ids(doc))).toarray()
+        n = len(sents)
+        dense = (get_edge_weights(doc) - (1. - damping) / n) / damping
+        assert np.allclose(sparse, dense, rtol = 0, atol = 1e-9), name
+
+def test_sparse_ranks_match_dense():
+    for name, sents in docs.items():
+        doc = make_doc(sents)
+        dense, sparse = dense_ranks(doc), sparse_ranks(doc)
+        assert np.allclose(sparse, dense, rtol = 0, atol = 1e-9), name
+        assert list(np.argsort(-sparse, kind = "stable")) == list(np.argsort(-dense, kind = "stable")), name
+
+def test_warm_start_after_edit():
+    before = make_doc(docs['plain'])
+    ranked = rate_sentences(before)
+    # drop the second sentence and add a new one at the end
+    edited = make_doc(docs['plain'][:1] + docs['plain'][2:] + [["The", "cat", "slept", "."]])
+    cold = rate_sentences(edited)
+    warm, convergence = rate_sentences_with_report(edited, previous = ranked)
+    assert convergence.converged
+    assert [sent for sent, _ in warm] == [sent for sent, _ in cold]
+    assert np.allclose([rank for _, rank in warm], [rank for _, rank in cold], atol = 1e-3)
+
+def test_warm_start_vector():
+    start = warm_start(["a", "b", "c"], [("a", 0.5), ("c", 0.2), ("gone", 0.3)])
+    assert np.isclose(start.sum(), 1.)
+    # the new sentence gets 1/3 before renormalizing
+    assert np.allclose(start, np.array([0.5, 1. / 3, 0.2]) / (0.5 + 1. / 3 + 0.2))
+
+def test_rate_sentences_returns_rankings():
+    doc = make_doc(docs['plain'])
+    ranked = rate_sentences(doc)
+    assert [sent for sent, _ in ranked] == [sent.text for sent in doc.sents]
+    assert np.allclose([rank for _, rank in ranked], dense_ranks(doc), atol = 1e-9)
+    assert rate_sentences_with_report(doc)[0] == ranked
+
+def test_convergence_reported():
+    with pytest.warns(RuntimeWarning):
+        check_convergence(Convergence(1000, 0.5, False))
+    summaries = list(summarize_many([make_doc(sents) for sents in docs.values()], 1))
+    assert all(summary.convergence.converged for summary in summaries)
+
+def test_summarize_traces_the_sparse_path():
+    tracer.reset()
+    tracer.enable()
+    try:
+        summarize(make_doc(docs['plain']), 1)
+    finally:
+        tracer.disable()
+    for name in ["textrank.summarize", "textrank.incidence_matrix", "textrank.sparse_edge_weights", "textrank.pagerank"]:
+        assert tracer.metrics[name].calls == 1, name
+    tracer.reset()
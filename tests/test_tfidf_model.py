@@ -0,0 +1,48 @@
+""" TfidfModel gives the same summaries as TfidfSummarizer for documents in its background corpus,
+and a saved model can be memory-mapped back and updated.
+"""
+import numpy as np
+
+from tfidf_model import TfidfModel
+from tfidf_summarizer import TfidfSummarizer
+
+from test_tfidf_summarizer import random_corpus, tfidf_matrix
+
+def test_matches_tfidf_summarizer():
+    docs = random_corpus()
+    model = TfidfModel().partial_fit(docs)
+    summarizer = TfidfSummarizer(*tfidf_matrix(docs))
+    for i, doc in enumerate(docs):
+        for sum_length in (1, 2, 3):
+            assert model.summarize(doc, sum_length) == summarizer.summarize(doc, i, sum_length)
+
+def test_weights_match_matrix_rows():
+    docs = random_corpus(10)
+    model = TfidfModel().partial_fit(docs)
+    idx, tfidf = tfidf_matrix(docs)
+    col = {term: i for i, term in enumerate(idx)}
+    for i, doc in enumerate(docs):
+        tok_terms, weights = model.weigh(doc)
+        for tok, term in zip(doc, tok_terms):
+            if term >= 0:
+                assert np.isclose(weights[term], tfidf[i, col[tok.lower_]])
+
+def test_save_load_partial_fit(tmp_path):
+    docs = random_corpus(20)
+    model = TfidfModel().partial_fit(docs[:10])
+    model.save(str(tmp_path))
+    saved = np.load(str(tmp_path / "df.npy"))
+
+    loaded = TfidfModel.load(str(tmp_path), mmap = True)
+    assert isinstance(loaded.df, np.memmap)
+    assert loaded.summarize(docs[0], 2) == model.summarize(docs[0], 2)
+
+    loaded.partial_fit(docs[10:])
+    whole = TfidfModel().partial_fit(docs)
+    assert loaded.num_docs == whole.num_docs == 20
+    assert loaded.vocabulary == whole.vocabulary
+    assert np.array_equal(loaded.df[:loaded.num_terms], whole.df[:whole.num_terms])
+    for doc in docs:
+        assert loaded.summarize(doc, 2) == whole.summarize(doc, 2)
+    # updating the loaded model doesn't write through to the saved file
+    assert np.array_equal(np.load(str(tmp_path / "df.npy")), saved)
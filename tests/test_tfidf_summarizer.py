@@ -0,0 +1,95 @@
+""" tfidf_summarizer gives the same summaries as the original implementation.
+"""
+import random
+
+import numpy as np
+import spacy
+from scipy import sparse
+
+from tfidf_summarizer import tokenize, tfidf_summarizer, summarizer_for
+
+nlp = spacy.blank("en")
+nlp.add_pipe("sentencizer")
+
+def reference_tfidf_summarizer(doc, doc_index, idx, tfidf, sum_length = 1):
+    """ The original tfidf_summarizer, kept to check the indexed version against.
+    """
+    weights = tfidf.copy()
+    sents = list(doc.sents)
+
+    sum_count = 0
+    summary = []
+
+    while sum_count < sum_length:
+
+        best_sent = None
+        best_weight = 0
+
+        for sent in sents:
+            if len(sent) >= 15:
+                weight = 0
+                for tok in sent:
+                    if not tok.is_punct:
+                        try:
+                            weight += weights[doc_index, idx.index(tok.lower_)]
+                        except ValueError:
+                            pass
+                weight = weight / len(sent)
+                if weight > best_weight:
+                    best_sent = sent
+                    best_weight = weight
+
+        summary.append(best_sent.text)
+        sum_count += 1
+
+        for tok in best_sent:
+            if not tok.is_punct:
+                weights[doc_index, idx.index(tok.lower_)] = weights[doc_index, idx.index(tok.lower_)] ** 2
+
+    return " ".join(summary)
+
+words = ["police", "city", "team", "report", "said", "found", "people", "story", "week", "new",
+         "old", "the", "a", "in", "on", "Mayor", "council", "vote", "budget", "school"]
+
+def random_corpus(num_docs = 30, seed = 0):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(num_docs):
+        sents = []
+        for _ in range(rng.randint(3, 8)):
+            sent = " ".join(rng.choice(words) for _ in range(rng.randint(8, 25)))
+            sents.append(sent[0].upper() + sent[1:] + rng.choice([".", "!", "?"]))
+        texts.append(" ".join(sents))
+    return list(nlp.pipe(texts))
+
+def tfidf_matrix(docs):
+    # same layout as get_tfidf_matrix, without sklearn: smoothed idf, l2-normalized rows
+    idx = sorted(set(term for doc in docs for term in tokenize(doc)))
+    col = {term: i for i, term in enumerate(idx)}
+    counts = np.zeros((len(docs), len(idx)))
+    for row, doc in enumerate(docs):
+        for term in tokenize(doc):
+            counts[row, col[term]] += 1
+    idf = np.log((1 + len(docs)) / (1 + (counts > 0).sum(axis = 0))) + 1
+    weights = counts * idf
+    weights /= np.linalg.norm(weights, axis = 1)[:, None]
+    return idx, sparse.csr_matrix(weights)
+
+def test_matches_reference():
+    docs = random_corpus()
+    idx, tfidf = tfidf_matrix(docs)
+    dense = tfidf.toarray()
+    checked = 0
+    for i, doc in enumerate(docs):
+        if not any(len(sent) >= 15 for sent in doc.sents):
+            continue # the original fails when no sentence is long enough
+        for sum_length in (1, 2, 3):
+            assert tfidf_summarizer(doc, i, idx, tfidf, sum_length) == reference_tfidf_summarizer(doc, i, idx, dense, sum_length)
+            checked += 1
+    assert checked > 0
+
+def test_summarizer_built_once():
+    docs = random_corpus(5)
+    idx, tfidf = tfidf_matrix(docs)
+    assert summarizer_for(idx, tfidf) is summarizer_for(idx, tfidf)
+    assert summarizer_for(list(idx), tfidf) is not summarizer_for(idx, tfidf)
@@ -0,0 +1,55 @@
+""" Stack sampling profiles each top-level traced call, including the calls a stage makes and
+calls made from other threads.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer, stage, traced
+
+@traced("test.sleepy")
+def sleepy(seconds):
+    time.sleep(seconds) # releases the GIL, so the sampler gets to run
+    return seconds
+
+@traced("test.outer")
+def outer(seconds):
+    return sleepy(seconds)
+
+def profile(fn, profile_slowest = 10):
+    tracer.reset()
+    tracer.enable(profile_slowest = profile_slowest, interval = 0.001)
+    try:
+        fn()
+    finally:
+        tracer.disable()
+    labels = sorted(label for _, _, label, _ in tracer.slowest)
+    samples = [samples for _, _, _, samples in tracer.slowest]
+    tracer.reset()
+    return labels, samples
+
+def test_stage_calls_profiled_separately():
+    def run():
+        with stage("test.corpus", items = 6):
+            for _ in range(6):
+                outer(0.02)
+    labels, samples = profile(run)
+    # one profile per call made in the stage, not one for the whole stage; nested calls aren't separate
+    assert labels == sorted("test.outer-{}".format(n) for n in range(1, 7))
+    assert all(any("sleepy" in stack for stack in counts) for counts in samples)
+
+def test_slowest_kept():
+    def run():
+        for seconds in (0.01, 0.05, 0.01, 0.04, 0.01):
+            sleepy(seconds)
+    labels, _ = profile(run, profile_slowest = 2)
+    assert labels == ["test.sleepy-2", "test.sleepy-4"]
+
+def test_executor_threads_sampled():
+    def run():
+        with ThreadPoolExecutor(2) as pool:
+            assert list(pool.map(sleepy, [0.05, 0.05, 0.05])) == [0.05, 0.05, 0.05]
+    labels, samples = profile(run)
+    # calls in worker threads are sampled in those threads, one at a time
+    assert labels
+    assert all(label.startswith("test.sleepy-") for label in labels)
+    assert all(any("sleepy (test_tracing.py" in stack for stack in counts) for counts in samples)
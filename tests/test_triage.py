@@ -0,0 +1,102 @@
+""" The triage rules without a parse: sentence boundaries, the superlative heuristic, the fallback
+to a full parse for features that need one, and the agreement report. A blank model with a
+sentencizer stands in for the full model.
+"""
+import numpy as np
+import spacy
+
+from features import extract
+from triage import rule_sentences, rule_superlative, Triage, agreement_report, tokenizer_features
+
+def blank_model(vectors = ()):
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    for i, word in enumerate(vectors):
+        nlp.vocab.set_vector(word, np.full(4, i + 1., dtype = np.float32))
+    return nlp
+
+class RecordingModel(object):
+    """ Wraps a model, recording the texts it is asked to parse.
+    """
+
+    def __init__(self, nlp):
+        self.nlp = nlp
+        self.parsed = []
+
+    def pipe(self, texts, batch_size = 256):
+        texts = list(texts)
+        self.parsed.extend(texts)
+        return self.nlp.pipe(texts, batch_size = batch_size)
+
+headlines = ["You won't believe what happened next!",
+             "10 things only cats understand",
+             "Why the city voted no. 5 reasons",
+             "Council passes budget",
+             "The best and worst of the week",
+             "These 7 photos will make you cry",
+             "What is the greatest city? The answer may surprise you"]
+
+def test_rule_sentences():
+    nlp = blank_model()
+    assert rule_sentences(nlp.make_doc("Stocks fell. 10 reasons why!")) == [(0, 3), (3, 7)]
+    assert rule_sentences(nlp.make_doc("Wait... what?! No")) == [(0, 2), (2, 5), (5, 6)]
+    assert rule_sentences(nlp.make_doc("No punctuation here")) == [(0, 3)]
+    assert rule_sentences(nlp.make_doc("")) == []
+    # the same boundaries as the sentencizer on plain headlines
+    for text in headlines:
+        doc = nlp(text)
+        assert rule_sentences(doc) == [(sent.start, sent.end) for sent in doc.sents], text
+
+def test_rule_superlative():
+    nlp = blank_model(["great", "greater", "fin", "finer", "fine"])
+    def superlative(text):
+        return rule_superlative(nlp.make_doc(text)[0])
+    assert superlative("greatest")
+    assert superlative("Greatest")
+    assert superlative("best") # irregular, no vectors needed
+    assert not superlative("finest") # stem "fin" + "e" is a word: lemmatized to "fine", not "fin"
+    assert not superlative("honest") # "hon" has no vector
+    assert not superlative("great")
+
+def test_tokenizer_features_match_full_parse():
+    nlp = blank_model()
+    triage = Triage(nlp)
+    assert triage.fast == ["listicle", "leadsWithQuestion", "accusatory"] # no vectors for superlative
+    fast = triage.run(headlines, triage.fast)
+    full = extract(nlp.pipe(headlines), triage.fast)
+    for name in triage.fast:
+        assert list(fast[name]) == list(full[name]), name
+    assert fast["accusatory"].any() and fast["leadsWithQuestion"].any() and fast["listicle"].any()
+
+def test_slow_features_fall_back_to_full_parse():
+    nlp = blank_model()
+    full_nlp = RecordingModel(blank_model())
+    triage = Triage(nlp, full_nlp)
+
+    triage.run(headlines, ["accusatory"])
+    assert full_nlp.parsed == [] # tokenizer only
+
+    names = ["superlative", "accusatory", "numNamedEntities"]
+    results = triage.run(headlines, names)
+    assert list(results) == names
+    assert full_nlp.parsed == headlines # parsed once, for superlative and numNamedEntities together
+    expected = extract(nlp.pipe(headlines), ["superlative", "numNamedEntities", "accusatory"])
+    for name in names:
+        assert list(results[name]) == list(expected[name]), name
+
+def test_agreement_report():
+    nlp = blank_model()
+    report = agreement_report(headlines, Triage(nlp))
+    assert sorted(report) == sorted(["listicle", "leadsWithQuestion", "accusatory"])
+    for name, counts in report.items():
+        assert counts == {'n': len(headlines), 'agreement': 1., 'false_positives': 0, 'false_negatives': 0}, name
+
+def test_agreement_report_counts_disagreements():
+    # the full model has no lemmatizer, so it never finds "greatest"; the fast path does
+    nlp = blank_model(["great", "greater"])
+    triage = Triage(nlp)
+    assert triage.fast == tokenizer_features
+    report = agreement_report(headlines, triage)
+    counts = report["superlative"]
+    assert (counts['false_positives'], counts['false_negatives']) == (1, 0)
+    assert np.isclose(counts['agreement'], (len(headlines) - 1.) / len(headlines))
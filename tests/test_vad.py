@@ -0,0 +1,84 @@
+""" VadLexicon gives exactly the averages of the original per-token get_vad, including NaN for
+titles with no words in the lexicon.
+"""
+import random
+import warnings
+
+import numpy as np
+import pandas as pd
+import spacy
+from spacy.tokens import Doc
+
+from vad import VadLexicon, get_vad, vadtup
+
+vocab = spacy.blank("en").vocab
+
+lexicon_words = ["cat", "dog", "shock", "win", "lose", "secret", "amazing", "hate", "love", "city"]
+
+def write_lexicon(path, seed = 0):
+    """ A small lexicon laid out like Data/vad.csv: a row number, then the word, then the scores.
+    """
+    rng = np.random.RandomState(seed)
+    vad = pd.DataFrame({'Word': lexicon_words,
+                        'V.Mean.Sum': rng.uniform(1, 9, len(lexicon_words)),
+                        'A.Mean.Sum': rng.uniform(1, 9, len(lexicon_words)),
+                        'D.Mean.Sum': rng.uniform(1, 9, len(lexicon_words)),
+                        'V.SD.Sum': rng.uniform(0, 3, len(lexicon_words))})
+    vad.index += 1
+    vad.to_csv(path)
+    return path
+
+def reference_get_vad(doc, vad):
+    """ The original get_vad, kept to check the lexicon against.
+    """
+    scores = [vadtup(vad.loc[tok.lemma_.lower()]['valence'], vad.loc[tok.lemma_.lower()]['arousal'], vad.loc[tok.lemma_.lower()]['dominance'])
+              for tok in doc if tok.lemma_.lower() in vad.index]
+
+    avg_val = np.mean([tup.valence for tup in scores])
+    avg_arous = np.mean([tup.arousal for tup in scores])
+    avg_dom = np.mean([tup.dominance for tup in scores])
+
+    return vadtup(avg_val, avg_arous, avg_dom)
+
+def read_reference_lexicon(path):
+    vad = pd.read_csv(path, index_col = 1)
+    vad = vad[['V.Mean.Sum', 'A.Mean.Sum', 'D.Mean.Sum']]
+    return vad.rename(index = str, columns = {'V.Mean.Sum':'valence', 'A.Mean.Sum':'arousal', 'D.Mean.Sum':'dominance'})
+
+def make_title(words):
+    # lemmas are the words themselves, so upper-case words only match after lower-casing
+    return Doc(vocab, words = words, lemmas = words)
+
+words = lexicon_words + ["Cat", "SHOCK", "Win", "the", "a", "you", "never", "believe", "!", "?"]
+
+def random_titles(num, seed = 0):
+    rng = random.Random(seed)
+    return [make_title([rng.choice(words) for _ in range(rng.randint(1, 30))]) for _ in range(num)]
+
+def assert_same(scores, expected):
+    # exactly equal, with NaN in the same places
+    assert np.array_equal(np.asarray(scores), np.asarray(expected), equal_nan = True)
+
+def test_matches_reference(tmp_path):
+    path = write_lexicon(str(tmp_path / "vad.csv"))
+    vad = read_reference_lexicon(path)
+    lexicon = VadLexicon.from_csv(path)
+    titles = random_titles(500) + [make_title(["You", "never", "believe", "!"])]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning) # np.mean of an empty list
+        expected = [reference_get_vad(title, vad) for title in titles]
+    assert any(np.isnan(scores.valence) for scores in expected)
+    assert_same(lexicon.score(titles), expected)
+    for title, scores in zip(titles, expected):
+        assert_same(get_vad(title, lexicon), scores)
+
+def test_no_hits(tmp_path):
+    lexicon = VadLexicon.from_csv(write_lexicon(str(tmp_path / "vad.csv")))
+    assert np.isnan(lexicon.score([make_title(["the", "a", "!"])])).all()
+    assert lexicon.score([]).shape == (0, 3)
+
+def test_float32(tmp_path):
+    path = write_lexicon(str(tmp_path / "vad.csv"))
+    titles = random_titles(50)
+    exact = VadLexicon.from_csv(path).score(titles)
+    assert np.allclose(VadLexicon.from_csv(path, dtype = np.float32).score(titles), exact, equal_nan = True)
@@ -0,0 +1,85 @@
+""" The exported vector table gives the same vectors as the vocab it came from, span vectors
+match spaCy's normalized Span.vector, and title chunks missing from the article are matched
+through it.
+"""
+import numpy as np
+import spacy
+from spacy.tokens import Doc
+
+from vector_table import export_vectors, load_table, VectorTable
+from match_title_ents import ArticleIndex, similar_spans, match_title_ents
+from test_merged_tokens import hand_parsed_article
+
+def vocab_with_vectors(vectors):
+    vocab = spacy.blank("en").vocab
+    for word, vector in vectors.items():
+        vocab.set_vector(word, np.asarray(vector, dtype = np.float32))
+    return vocab
+
+def random_vectors(words, width = 8, seed = 0):
+    rng = np.random.RandomState(seed)
+    return {word: rng.normal(size = width) for word in words}
+
+def test_export_and_lookup(tmp_path):
+    words = ["cat", "dog", "city", "Mayor", "praised", "Boston", "the"]
+    vocab = vocab_with_vectors(random_vectors(words))
+    path = str(tmp_path / "vectors")
+    export_vectors(vocab, path, chunk_rows = 3) # several chunks
+    table = VectorTable(path)
+    assert table.width == 8
+    rows = table.lookup([vocab.strings[word] for word in words] + [vocab.strings.add("unknown")])
+    assert rows[-1] == -1
+    for word, row in zip(words, rows):
+        assert np.array_equal(table.vectors[row], vocab.get_vector(word)), word
+    assert load_table(path) is load_table(path)
+
+def test_span_vectors_match_span_vector(tmp_path):
+    vocab = vocab_with_vectors(random_vectors(["cat", "dog", "city", "big"]))
+    path = str(tmp_path / "vectors")
+    export_vectors(vocab, path)
+    table = VectorTable(path)
+    doc = Doc(vocab, words = ["the", "big", "cat", "saw", "a", "dog", "in", "the", "city"])
+    bounds = [(0, 3), (4, 6), (8, 9), (2, 3), (3, 5), (0, 9)] # (3, 5) has no vectors
+    spans = table.span_vectors([tok.orth for tok in doc], bounds)
+    for (start, end), vector in zip(bounds, spans):
+        expected = doc[start:end].vector
+        norm = np.linalg.norm(expected)
+        if norm > 0:
+            expected = expected / norm
+        assert np.allclose(vector, expected, atol = 1e-6), (start, end)
+    assert not spans[4].any()
+    assert table.span_vectors([tok.orth for tok in doc], []).shape == (0, 8)
+
+def politics_vocab():
+    # "Politician" points the same way as "Barack" and "Obama", and away from everything else
+    width = 4
+    basis = np.eye(width)
+    return vocab_with_vectors({"Barack": basis[0], "Obama": basis[0], "Politician": basis[0],
+                               "mayor": basis[1], "Boston": basis[2], "city": basis[3]})
+
+def politician_title(vocab):
+    return Doc(vocab, words = ["Politician", "praised"], heads = [1, 1], deps = ["nsubj", "ROOT"],
+               pos = ["NOUN", "VERB"], lemmas = ["politician", "praise"])
+
+def test_similar_spans(tmp_path):
+    vocab = politics_vocab()
+    path = str(tmp_path / "vectors")
+    export_vectors(vocab, path)
+    table = load_table(path)
+    doc = hand_parsed_article(vocab)
+    index = ArticleIndex(doc)
+    title = politician_title(vocab)
+    chunks = list(title.noun_chunks)
+    [similar] = similar_spans(chunks, title, index, table)
+    assert [index.merged.text[k] for k in similar] == ["Barack Obama"]
+    assert similar_spans(chunks, title, index, table, min_similarity = 1.1) == [[]]
+
+def test_match_falls_back_to_vectors(tmp_path):
+    vocab = politics_vocab()
+    path = str(tmp_path / "vectors")
+    export_vectors(vocab, path)
+    doc = hand_parsed_article(vocab)
+    title = politician_title(vocab)
+    # "politician" never occurs in the article, so only the vectors can match it
+    assert match_title_ents(title, doc, index = ArticleIndex(doc)) == {}
+    assert match_title_ents(title, doc, index = ArticleIndex(doc), vectors = load_table(path)) == {"Politician": ["Barack Obama"]}
@@ -9,11 +9,21 @@ https://pypi.org/project/sumy/
 
 import numpy as np
 import math
+import time
+import warnings
+from collections import deque, namedtuple
 from operator import itemgetter
 
+from tracing import traced
+
+# scipy and spaCy are imported where they're used, so importing the summarizer stays cheap
+
 delta = 1e-7 # prevents division by zero error when normalizing weight matrix
 damping = 0.85 # probability of jumping to a connected vertex, following web surfer model
 epsilon = 1e-4 # error tolerance for power method
+max_iter = 1000 # iteration cap for power method, so a matrix that doesn't converge can't hang a worker
+
+pipeline_needs = {"lemma", "is_stop", "is_punct", "sents"} # annotations read, see parsing.Parser
 
 def tokenize(doc):
     """ Split the tokens of a spaCy document into lemmas, removing punctuation and stopwords.
@@ -77,13 +87,16 @@ def get_edge_weights(doc):
     
     return np.full((num_sents, num_sents), (1. - damping) / num_sents) + damping * weights
 
-def power_method(matrix, epsilon):
+Convergence = namedtuple("Convergence", ['iterations', 'residual', 'converged'])
+
+def power_method(matrix, epsilon, max_iter = max_iter):
     """ Iterative power method for estimating largest eigenvalue and associated eigenvector of 
         a diagonalizable matrix. The eigenvector gives the TextRank sentence rankings.
 
         Args:
             matrix (numpy.array): a diagonalizable matrix
             epsilon (float): error tolerance for the estimation
+            max_iter (int): maximum number of iterations
 
         Returns:
             numpy.array: the estimated eigenvector
@@ -92,27 +105,195 @@ def power_method(matrix, epsilon):
     num_sents = len(matrix)
     p_vector = np.array([1.0 / num_sents] * num_sents)
     lambda_val = 1.0
+    iterations = 0
 
-    while lambda_val > epsilon:
+    while lambda_val > epsilon and iterations < max_iter:
+        iterations += 1
         next_p = np.dot(transposed_matrix, p_vector)
         lambda_val = np.linalg.norm(np.subtract(next_p, p_vector))
         p_vector = next_p
 
     return p_vector
 
-def rate_sentences(doc):
+def sentence_lemma_ids(doc):
+    """ Extract the (sentence, lemma) pairs TextRank works from, using spaCy's attribute arrays.
+        Equivalent to calling tokenize on every sentence, without a Python loop over tokens.
+
+    Args:
+        doc (spacy.tokens.doc.Doc): a spaCy document
+
+    Returns:
+        numpy.array: sentence number of each content token
+        numpy.array: lemma hash of each content token
+        int: number of sentences in the document
+    """
+    from spacy.attrs import LEMMA, IS_PUNCT, IS_STOP
+    sent_lengths = [len(sent) for sent in doc.sents]
+    sent_ids = np.repeat(np.arange(len(sent_lengths)), sent_lengths)
+    attrs = doc.to_array([LEMMA, IS_PUNCT, IS_STOP])
+    content = (attrs[:, 1] == 0) & (attrs[:, 2] == 0)
+    return sent_ids[content], attrs[content, 0], len(sent_lengths)
+
+@traced("textrank.incidence_matrix")
+def incidence_matrix(sent_ids, lemma_ids, num_sents):
+    """ Build the binary sentence-by-lemma incidence matrix.
+
+    Args:
+        sent_ids (numpy.array): sentence number of each content token
+        lemma_ids (numpy.array): lemma (any hashable integer id) of each content token
+        num_sents (int): number of sentences
+
+    Returns:
+        scipy.sparse.csr_matrix: entry (i, j) is 1 if sentence i contains lemma j
+    """
+    from scipy import sparse
+    lemmas, cols = np.unique(lemma_ids, return_inverse = True)
+    data = np.ones(len(cols))
+    matrix = sparse.csr_matrix((data, (sent_ids, cols)), shape = (num_sents, len(lemmas)))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1. # repeated words only count once, as in sent_similarity
+    return matrix
+
+@traced("textrank.sparse_edge_weights")
+def sparse_edge_weights(incidence):
+    """ Compute the row-normalized (undamped) edge weights from a sentence-by-lemma incidence matrix.
+        Gives the same weights as get_edge_weights before damping, using one sparse matrix product
+        for all the sentence overlaps instead of comparing every pair of sentences.
+
+    Args:
+        incidence (scipy.sparse.csr_matrix): output of incidence_matrix
+
+    Returns:
+        scipy.sparse.csr_matrix: the edge weights, with shape (# of sents in doc, # of sents in doc)
+    """
+    from scipy import sparse
+    overlaps = (incidence @ incidence.T).tocoo() # shared lemma counts; zero overlaps are never stored
+    log_lengths = np.log(np.maximum(incidence.getnnz(axis = 1), 1))
+    norm = log_lengths[overlaps.row] + log_lengths[overlaps.col]
+    # as in sent_similarity, skip normalization when it would divide by (nearly) zero
+    short = np.isclose(norm, 0.)
+    data = overlaps.data / np.where(short, 1., norm)
+    weights = sparse.csr_matrix((data, (overlaps.row, overlaps.col)), shape = overlaps.shape)
+    row_sums = np.asarray(weights.sum(axis = 1)).ravel()
+    return sparse.diags(1. / (row_sums + delta)) @ weights
+
+@traced("textrank.pagerank")
+def pagerank(weights, epsilon = epsilon, max_iter = max_iter, start = None):
+    """ Power method over the damped transition matrix, applying the uniform teleportation
+        term implicitly so nothing of size (# of sents)^2 is ever allocated. Equivalent to calling
+        power_method on the dense matrix returned by get_edge_weights.
+
+        Args:
+            weights (scipy.sparse.csr_matrix): output of sparse_edge_weights
+            epsilon (float): error tolerance for the estimation
+            max_iter (int): maximum number of iterations
+            start (numpy.array): initial ranking, e.g. from a previous version of the document;
+                defaults to the uniform vector
+
+        Returns:
+            numpy.array: the estimated eigenvector
+            Convergence: number of iterations run, final residual, and whether it got below epsilon
+    """
+    num_sents = weights.shape[0]
+    transposed_matrix = weights.T.tocsr()
+    if start is None:
+        p_vector = np.full(num_sents, 1.0 / num_sents)
+    elif len(start) != num_sents:
+        raise ValueError("start has length {}, expected {}".format(len(start), num_sents))
+    else:
+        p_vector = np.array(start, dtype = float)
+    next_p = np.empty(num_sents)
+    diff = np.empty(num_sents)
+    residual = np.inf
+    iterations = 0
+
+    while residual > epsilon and iterations < max_iter:
+        np.multiply(transposed_matrix @ p_vector, damping, out = next_p)
+        next_p += (1. - damping) / num_sents * p_vector.sum()
+        np.subtract(next_p, p_vector, out = diff)
+        residual = np.linalg.norm(diff)
+        p_vector, next_p = next_p, p_vector # swap buffers rather than allocating a new vector
+        iterations += 1
+
+    return p_vector, Convergence(iterations, float(residual), bool(residual <= epsilon))
+
+def warm_start(sent_texts, previous):
+    """ Initial ranking for a document from the rankings of an earlier version of it, e.g. before an edit.
+        Sentences are matched by text, so sentences can be added, removed or moved; sentences that
+        weren't in the earlier version start from the uniform value 1 / (# of sents).
+
+    Args:
+        sent_texts (list of strings): text of each sentence in the document
+        previous (list of tuples): (sentence, ranking) for each sentence of the earlier version,
+            as from rate_sentences
+
+    Returns:
+        numpy.array: starting vector for pagerank, summing to 1
+    """
+    num_sents = len(sent_texts)
+    ranks = dict(previous)
+    start = np.array([ranks.get(text, 1.0 / num_sents) for text in sent_texts], dtype = float)
+    return start / start.sum()
+
+def check_convergence(convergence):
+    """ Warn when the power method hit its iteration cap before reaching the error tolerance.
+
+    Args:
+        convergence (Convergence): report from pagerank
+    """
+    if not convergence.converged:
+        warnings.warn("TextRank did not converge in {} iterations (residual {:.3g}, tolerance {:g})"
+                      .format(convergence.iterations, convergence.residual, epsilon), RuntimeWarning, stacklevel = 3)
+
+def rate_sentences_with_report(doc, previous = None):
+    """ Generate TextRank rankings for all sentences in a document, along with the power method's report.
+
+    Args:
+        doc (spacy.tokens.doc.Doc): a spaCy document
+        previous (list of tuples): optional rankings of an earlier version of the document, as returned
+            by rate_sentences, to warm-start the power method from (see warm_start)
+
+    Returns:
+        list of tuples: (sentence, ranking) for each sentence in the document
+        Convergence: number of iterations run, final residual, and whether it got below epsilon
+    """
+    sents = [sent.text for sent in doc.sents]
+    start = warm_start(sents, previous) if previous is not None else None
+    weights = sparse_edge_weights(incidence_matrix(*sentence_lemma_ids(doc)))
+    ranks, convergence = pagerank(weights, start = start)
+    return list(zip(sents, ranks)), convergence
+
+def rate_sentences(doc, previous = None):
     """ Generate TextRank rankings for all sentences in a document.
+        A warning is issued if the power method didn't converge; use rate_sentences_with_report
+        to get its report instead.
 
     Args:
         doc (spacy.tokens.doc.Doc): a spaCy document
+        previous (list of tuples): optional rankings of an earlier version of the document, as returned
+            by rate_sentences, to warm-start the power method from (see warm_start)
 
     Returns:
         list of tuples: (sentence, ranking) for each sentence in the document
     """
-    matrix = get_edge_weights(doc)
-    ranks = power_method(matrix, epsilon)
-    return [(sent.text, rank) for sent, rank in zip(doc.sents, ranks)]
+    ranked_sents, convergence = rate_sentences_with_report(doc, previous)
+    check_convergence(convergence)
+    return ranked_sents
+
+def top_sentences(ranked_sents, num_sents):
+    """ Join the highest-ranked sentences into a summary.
+
+    Args:
+        ranked_sents (list of tuples): (sentence, ranking) for each sentence, as from rate_sentences
+        num_sents (int): number of sentences to include in the summary
+
+    Returns:
+        string: the document summary
+    """
+    sorted_sents = [sent for (sent, rank) in sorted(ranked_sents, key = itemgetter(1), reverse = True)]
+    return " ".join(sorted_sents[:num_sents])
 
+@traced("textrank.summarize")
 def summarize(doc, num_sents):
     """ Produce a TextRank summary of a document.
 
@@ -124,5 +305,75 @@ def summarize(doc, num_sents):
         string: the document summary
     """
     ranked_sents = rate_sentences(doc)
-    sorted_sents = [sent for (sent, rank) in sorted(ranked_sents, key = itemgetter(1), reverse = True)]
-    return " ".join(sorted_sents[:num_sents])
\ No newline at end of file
+    return top_sentences(ranked_sents, num_sents)
+
+TimedSummary = namedtuple("TimedSummary", ['summary', 'num_sents', 'seconds', 'convergence'])
+
+def _extract(doc):
+    """ Pull out everything ranking needs from a document, as plain picklable data.
+    """
+    return [sent.text for sent in doc.sents], sentence_lemma_ids(doc)
+
+def _summarize_extracted(args):
+    """ Summarize a document from the output of _extract. Runs in worker processes.
+    """
+    (sent_texts, lemma_ids), num_sents = args
+    start = time.perf_counter()
+    weights = sparse_edge_weights(incidence_matrix(*lemma_ids))
+    ranks, convergence = pagerank(weights)
+    summary = top_sentences(list(zip(sent_texts, ranks)), num_sents)
+    return summary, len(sent_texts), time.perf_counter() - start, convergence
+
+def summarize_many(docs, num_sents, workers = 1):
+    """ Produce TextRank summaries for a stream of documents.
+        Only sentence texts and lemma ids are sent to the workers, not the Docs themselves.
+
+    Args:
+        docs (iterable of spacy.tokens.doc.Doc): documents to summarize
+        num_sents (int): number of sentences to include in each summary
+        workers (int): number of worker processes; 1 summarizes in this process
+
+    Returns:
+        generator of TimedSummary: summary, number of sentences in the document, seconds spent on it
+            (extraction plus ranking), and the power method's Convergence report, for each document
+            in input order; a warning is issued for each document that didn't converge
+    """
+    from parallel import ordered_map
+
+    extract_times = deque() # consumed as results come back, so this stays as short as the window
+    def extracted():
+        for doc in docs:
+            start = time.perf_counter()
+            args = (_extract(doc), num_sents)
+            extract_times.append(time.perf_counter() - start)
+            yield args
+
+    for summary, length, seconds, convergence in ordered_map(_summarize_extracted, extracted(), workers):
+        check_convergence(convergence) # here rather than in the workers, so the warning reaches the caller
+        yield TimedSummary(summary, length, extract_times.popleft() + seconds, convergence)
+
+def main():
+    # TextRank summaries of every article in the corpus, computed once per near-duplicate cluster (see dedup)
+    import os
+    import pandas as pd
+    from loader import read_clusters
+    from doc_cache import DocCache
+    from dedup import per_cluster
+    from parsing import load_model
+    from tracing import stage
+
+    articles = DocCache("Data/doc_cache/articles", load_model('en_core_web_lg')) # parsed by doc_cache.main
+    df = read_clusters("Data/clickbait.parquet") # written by clean.main
+    df = df[[id in articles for id in df.index]]
+
+    def summarize_ids(ids):
+        docs = (articles.get(id) for id in ids)
+        return [result.summary for result in summarize_many(docs, 3, workers = os.cpu_count())]
+
+    with stage("textrank.corpus", items = len(df)):
+        summaries = per_cluster(summarize_ids, zip(df.index, df.index), df['clusterId'])
+    pd.Series(summaries, name = 'summary').rename_axis('id').to_csv("Results/textrank_summaries.csv")
+    print("articles summarized:", df['clusterId'].nunique(), "of", len(df))
+
+if __name__ == "__main__":
+    main()
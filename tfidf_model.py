@@ -0,0 +1,142 @@
+""" Incrementally updatable TFIDF model for summarizing against a growing background corpus.
+
+Only document frequencies are kept, so new batches of documents can be added without
+refitting, and documents that aren't part of the background corpus can be scored directly.
+Weights follow sklearn's TfidfTransformer (smoothed idf, l2-normalized rows), so a document
+that is in the background corpus gets the same weights as its row from get_tfidf_matrix.
+"""
+
+import os
+import json
+
+import numpy as np
+
+from tfidf_summarizer import tokenize, summarize_weighted
+from tracing import traced
+
+class TfidfModel(object):
+    """ Document frequency counts for a background corpus.
+
+    Args:
+        n_features (int): if given, hash terms into this many columns instead of keeping a
+            vocabulary, which bounds memory at the cost of occasional collisions
+    """
+
+    def __init__(self, n_features = None):
+        self.n_features = n_features
+        self.vocabulary = {} # term -> column, unused when hashing
+        self.df = np.zeros(n_features or 1024, dtype = np.int64)
+        self.num_terms = n_features or 0
+        self.num_docs = 0
+
+    def _col(self, term, add = False):
+        if self.n_features:
+            from sklearn.utils import murmurhash3_32
+            return murmurhash3_32(term, positive = True) % self.n_features
+        col = self.vocabulary.get(term, -1)
+        if col < 0 and add:
+            col = self.vocabulary[term] = self.num_terms
+            self.num_terms += 1
+            if self.num_terms > len(self.df):
+                # grow geometrically so adding terms stays amortized constant time
+                self.df = np.concatenate([self.df, np.zeros(max(len(self.df), 1024), dtype = np.int64)])
+        return col
+
+    def partial_fit(self, docs):
+        """ Add a batch of documents to the background corpus.
+
+        Args:
+            docs (iterable of spacy.tokens.doc.Doc): the new documents
+
+        Returns:
+            TfidfModel: this model
+        """
+        if not self.df.flags.writeable:
+            self.df = np.array(self.df) # loaded read-only from disk; take a private copy to update
+        for doc in docs:
+            cols = set(self._col(term, add = True) for term in tokenize(doc))
+            self.df[list(cols)] += 1
+            self.num_docs += 1
+        return self
+
+    def idf(self, cols):
+        """ Inverse document frequencies, smoothed as in sklearn's TfidfTransformer.
+
+        Args:
+            cols (numpy.array): term columns; -1 for terms the model has never seen
+
+        Returns:
+            numpy.array: idf weight for each column
+        """
+        df = np.where(cols >= 0, self.df[np.maximum(cols, 0)], 0)
+        return np.log((1. + self.num_docs) / (1. + df)) + 1.
+
+    def weigh(self, doc):
+        """ TFIDF weights for the terms of a document, which needn't be part of the background corpus.
+            Terms the model has never seen get the maximum idf.
+
+        Args:
+            doc (spacy.tokens.doc.Doc): the document
+
+        Returns:
+            numpy.array: for each token, index of its term in the returned weights, or -1 for punctuation
+            numpy.array: l2-normalized TFIDF weight of each distinct term in the document
+        """
+        terms = {}
+        tok_terms = np.array([-1 if tok.is_punct else terms.setdefault(tok.lower_, len(terms)) for tok in doc],
+                             dtype = np.int64)
+        cols = np.array([self._col(term) for term in terms], dtype = np.int64)
+        tf = np.bincount(tok_terms[tok_terms >= 0], minlength = len(terms)).astype(float)
+        weights = tf * self.idf(cols)
+        norm = np.linalg.norm(weights)
+        if norm > 0:
+            weights /= norm
+        return tok_terms, weights
+
+    @traced("tfidf_model.summarize")
+    def summarize(self, doc, sum_length = 1):
+        """ Summarize a document using TFIDF weighting against the background corpus.
+
+        Args:
+            doc (spacy.tokens.doc.Doc): document to summarize
+            sum_length (int): number of sentences to extract for summary (default 1)
+
+        Returns:
+            string: document summary
+        """
+        tok_terms, weights = self.weigh(doc)
+        return summarize_weighted(doc, tok_terms, weights, sum_length)
+
+    def save(self, path):
+        """ Save the model to a directory. The document frequencies are stored as a .npy file
+            so they can be memory-mapped by load.
+
+        Args:
+            path (string): directory to save to
+        """
+        os.makedirs(path, exist_ok = True)
+        np.save(os.path.join(path, "df.npy"), self.df[:self.num_terms])
+        with open(os.path.join(path, "model.json"), "w") as f:
+            json.dump({'n_features': self.n_features, 'num_docs': self.num_docs,
+                       'vocabulary': self.vocabulary}, f)
+
+    @classmethod
+    def load(cls, path, mmap = True):
+        """ Load a model saved with save.
+
+        Args:
+            path (string): directory the model was saved to
+            mmap (bool): memory-map the document frequencies rather than reading them into memory,
+                so several processes can share one copy
+
+        Returns:
+            TfidfModel: the loaded model
+        """
+        with open(os.path.join(path, "model.json"), "r") as f:
+            meta = json.load(f)
+        model = cls(meta['n_features'])
+        model.num_docs = meta['num_docs']
+        model.vocabulary = meta['vocabulary']
+        model.df = np.load(os.path.join(path, "df.npy"), mmap_mode = 'r' if mmap else None)
+        model.num_terms = len(model.df)
+        return model
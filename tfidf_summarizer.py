@@ -1,5 +1,10 @@
-from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
-from cytoolz import identity
+from collections import OrderedDict
+
+import numpy as np
+
+from tracing import traced
+
+pipeline_needs = {"lower", "is_punct", "sents"} # annotations read, see parsing.Parser
 
 def tokenize(doc):
     """ Simple tokenizer that removes punctuation and leaves tokens as lower-case.
@@ -22,6 +27,8 @@ def get_tfidf_matrix(docs):
         list of strings: all terms in the matrix, to be used for indexing
         sparse numpy array: the TFIDF matrix; rows represent documents, columns are terms
     """
+    from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+    from cytoolz import identity
     cv = CountVectorizer(analyzer = identity)
     tokens = [tokenize(doc) for doc in docs]
     counts = cv.fit_transform(tokens)
@@ -29,50 +36,117 @@ def get_tfidf_matrix(docs):
     weights = tfidf.fit_transform(counts)
     return cv.get_feature_names(), weights
 
-def tfidf_summarizer(doc, doc_index, idx, tfidf, sum_length = 1):
-    """ Summarize a document using TFIDF weighting. Requires a background corpus to build TFIDF matrix. 
+def summarize_weighted(doc, cols, weights, sum_length = 1):
+    """ Pick the sentences with the highest average term weight, squaring the weights of the
+        terms in each chosen sentence so later picks favour different content.
 
     Args:
         doc (spacy.tokens.doc.Doc): document to summarize
-        doc_index (int): which row in TFIDF matrix corresponds to this document
-        idx (list of strings): first output from call to get_tfidf_matrix
-        tfidf (sparse numpy array): second output from call to get_tfidf_matrix
-        sum_length (int): number of sentences to extract for summary (default 1)
+        cols (numpy.array): for each token in doc, an index into weights, or -1 to ignore the token
+        weights (numpy.array): term weights for this document; updated in place
+        sum_length (int): number of sentences to extract for summary
 
     Returns:
         string: document summary
     """
-    
-    weights = tfidf.copy()
     sents = list(doc.sents)
+    lengths = np.array([len(sent) for sent in sents])
+    tok_sents = np.repeat(np.arange(len(sents)), lengths)
+    known = cols >= 0
+    eligible = lengths >= 15
 
-    sum_count = 0
     summary = []
 
-    while sum_count < sum_length:
-
-        best_sent = None
-        best_weight = 0
-
-        for sent in sents:
-            if len(sent) >= 15:
-                weight = 0
-                for tok in sent:
-                    if not tok.is_punct:
-                        try:
-                            weight += weights[doc_index, idx.index(tok.lower_)]
-                        except ValueError:
-                            pass
-                weight = weight / len(sent)
-                if weight > best_weight:
-                    best_sent = sent
-                    best_weight = weight
-            
+    for _ in range(sum_length):
+        tok_weights = np.where(known, weights[np.where(known, cols, 0)], 0.)
+        sent_weights = np.bincount(tok_sents, weights = tok_weights, minlength = len(sents)) / np.maximum(lengths, 1)
+        sent_weights[~eligible] = 0.
+        best = int(np.argmax(sent_weights))
+        if sent_weights[best] <= 0: # no sentence has any weight left to contribute
+            break
+        best_sent = sents[best]
         summary.append(best_sent.text)
-        sum_count += 1
 
-        for tok in best_sent:
-            if not tok.is_punct:
-                weights[doc_index, idx.index(tok.lower_)] = weights[doc_index, idx.index(tok.lower_)] ** 2
+        for col in cols[best_sent.start:best_sent.end]:
+            if col >= 0:
+                weights[col] = weights[col] ** 2
+
+    return " ".join(summary)
+
+class TfidfSummarizer(object):
+    """ Summarizes documents from a background corpus TFIDF matrix.
+    The term index is built once, and only the summarized document's row is copied.
+
+    Args:
+        idx (list of strings or dict): terms of the matrix (first output of get_tfidf_matrix),
+            or a term -> column mapping such as CountVectorizer.vocabulary_
+        tfidf (sparse numpy array): second output from call to get_tfidf_matrix
+    """
+
+    def __init__(self, idx, tfidf):
+        if isinstance(idx, dict):
+            self.vocabulary = idx
+        else:
+            self.vocabulary = {term: col for col, term in enumerate(idx)}
+        self.tfidf = tfidf.tocsr()
+
+    @traced("tfidf_summarizer.summarize")
+    def summarize(self, doc, doc_index, sum_length = 1):
+        """ Summarize a document using TFIDF weighting.
+
+        Args:
+            doc (spacy.tokens.doc.Doc): document to summarize
+            doc_index (int): which row in TFIDF matrix corresponds to this document
+            sum_length (int): number of sentences to extract for summary (default 1)
+
+        Returns:
+            string: document summary
+        """
+        get_col = self.vocabulary.get
+        cols = np.array([-1 if tok.is_punct else get_col(tok.lower_, -1) for tok in doc], dtype = np.int64)
+        # map the document's own terms to a small local array, so the cost doesn't depend on vocabulary size
+        terms, local_cols = np.unique(cols, return_inverse = True)
+        local_cols = np.where(cols >= 0, local_cols.ravel(), -1)
+        weights = self.tfidf[doc_index, np.maximum(terms, 0)].toarray().ravel()
+        return summarize_weighted(doc, local_cols, weights, sum_length)
+
+summarizer_cache = OrderedDict() # (id(idx), id(tfidf)) -> (idx, tfidf, TfidfSummarizer), least recently used first
+summarizer_cache_size = 4
 
-    return " ".join(summary)
\ No newline at end of file
+def summarizer_for(idx, tfidf):
+    """ Get the TfidfSummarizer for a background corpus, building it the first time and keeping it
+        in a small LRU cache, so the term index is built once rather than once per document.
+
+    Args:
+        idx (list of strings or dict): first output from call to get_tfidf_matrix
+        tfidf (sparse numpy array): second output from call to get_tfidf_matrix
+
+    Returns:
+        TfidfSummarizer: the summarizer for idx and tfidf
+    """
+    key = (id(idx), id(tfidf)) # the cache holds references to both, so the ids can't be reused while cached
+    if key in summarizer_cache:
+        summarizer_cache.move_to_end(key)
+    else:
+        summarizer_cache[key] = (idx, tfidf, TfidfSummarizer(idx, tfidf))
+        if len(summarizer_cache) > summarizer_cache_size:
+            summarizer_cache.popitem(last = False)
+    return summarizer_cache[key][2]
+
+@traced("tfidf_summarizer")
+def tfidf_summarizer(doc, doc_index, idx, tfidf, sum_length = 1):
+    """ Summarize a document using TFIDF weighting. Requires a background corpus to build TFIDF matrix. 
+        The summarizer for idx and tfidf is built on the first call and reused, see summarizer_for.
+        (idx and tfidf shouldn't be modified in place between calls.)
+
+    Args:
+        doc (spacy.tokens.doc.Doc): document to summarize
+        doc_index (int): which row in TFIDF matrix corresponds to this document
+        idx (list of strings): first output from call to get_tfidf_matrix
+        tfidf (sparse numpy array): second output from call to get_tfidf_matrix
+        sum_length (int): number of sentences to extract for summary (default 1)
+
+    Returns:
+        string: document summary
+    """
+    return summarizer_for(idx, tfidf).summarize(doc, doc_index, sum_length)
@@ -0,0 +1,314 @@
+""" Per-stage timing and memory metrics for the pipeline.
+
+Wrap a pipeline stage in `with stage("name") as s:` (setting s.items to the number of items it
+handled), or decorate a hot function with @traced("name"). While tracing is enabled, each call
+records wall time, item count, and the change in RSS (and in traced allocations, if tracemalloc is
+running); the totals per name can be written as JSON lines or as a Prometheus text file. Tracing
+is off by default, and a disabled traced function costs one attribute check per call. Metrics are
+kept per process, so calls made in worker processes aren't counted; time the stage that fans out.
+
+With profile_slowest = N, a background thread samples the stack of the calling thread during each
+top-level traced call (usually one document) and keeps the samples of the N slowest calls, which
+write_stacks dumps in the collapsed format flamegraph.pl and speedscope read. Stages don't count
+as calls here, so the documents a stage handles are profiled one by one, and calls made in other
+threads (e.g. an executor) are sampled in the thread that made them, one call at a time.
+
+Setting CLICKBAIT_TRACE=path in the environment enables tracing and writes the metrics to path at
+exit (Prometheus text if path ends in .prom, JSON lines otherwise); CLICKBAIT_PROFILE=N also dumps
+the stacks of the N slowest calls to path.stacks/.
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import atexit
+import threading
+import functools
+from collections import Counter, OrderedDict
+
+def current_rss():
+    """ Resident set size of this process in bytes. Falls back to the peak RSS where /proc isn't available.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class Metric(object):
+    """ Running totals for one stage or function.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.items = 0
+        self.seconds = 0.
+        self.max_seconds = 0.
+        self.rss_delta = 0
+        self.alloc_delta = 0
+
+    def add(self, seconds, items, rss_delta, alloc_delta):
+        self.calls += 1
+        self.items += items
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rss_delta += rss_delta
+        self.alloc_delta += alloc_delta
+
+    def to_dict(self):
+        return OrderedDict([('name', self.name), ('calls', self.calls), ('items', self.items),
+                            ('seconds', self.seconds), ('max_seconds', self.max_seconds),
+                            ('items_per_sec', self.items / self.seconds if self.seconds > 0 else None),
+                            ('rss_delta_bytes', self.rss_delta), ('alloc_delta_bytes', self.alloc_delta)])
+
+class Record(object):
+    """ Handed out by stage; set items to the number of items the stage handled.
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+class Sampler(object):
+    """ Samples the stack of the thread making the profiled call at a fixed interval.
+    Samples can only be taken when the profiled thread releases the GIL, so the effective
+    interval is at least sys.getswitchinterval() (5 ms by default).
+
+    Args:
+        interval (float): seconds between samples
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.current = None # (thread ident, Counter of collapsed stacks) for the call in progress, or None
+        self.lock = threading.Lock()
+        thread = threading.Thread(target = self._run, name = "tracing-sampler")
+        thread.daemon = True
+        thread.start()
+
+    def claim(self):
+        """ Start sampling the calling thread, unless a call in another thread is already being sampled.
+
+        Returns:
+            bool: whether the calling thread is now being sampled
+        """
+        with self.lock:
+            if self.current is not None:
+                return False
+            self.current = (threading.get_ident(), Counter())
+            return True
+
+    def release(self):
+        """ Stop sampling, so the next call to claim succeeds.
+        """
+        self.current = None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            current = self.current
+            if current is None:
+                continue
+            thread_id, samples = current
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename != __file__: # leave out the traced wrappers
+                    stack.append("{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            samples[";".join(reversed(stack))] += 1
+
+class Tracer(object):
+    """ Collects metrics for every stage and traced function. Use the module-level tracer.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.metrics = OrderedDict()
+        self.local = threading.local() # per thread: depth of traced calls in progress
+        self.sampler = None
+        self.tracemalloc = None # the tracemalloc module, once allocation tracking is on
+        self.slowest = [] # heap of (seconds, call number, label, samples)
+        self.profile_slowest = 0
+        self.num_profiled = 0
+
+    def enable(self, allocations = False, profile_slowest = 0, interval = 0.001):
+        """ Start recording.
+
+        Args:
+            allocations (bool): also record traced allocations with tracemalloc (slow)
+            profile_slowest (int): keep sampled stacks for this many of the slowest top-level calls
+            interval (float): seconds between stack samples
+        """
+        if allocations:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self.tracemalloc = tracemalloc
+        if profile_slowest and self.sampler is None:
+            self.sampler = Sampler(interval)
+        self.profile_slowest = profile_slowest
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.metrics = OrderedDict()
+        self.slowest = []
+        self.num_profiled = 0
+
+    def _metric(self, name):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = Metric(name)
+        return metric
+
+    def _start(self, call = True):
+        """ Begin timing. call is False for stages, which aren't profiled as a unit; only the
+        outermost traced call in each thread is.
+        """
+        sampled = False
+        if call:
+            depth = getattr(self.local, 'depth', 0)
+            self.local.depth = depth + 1
+            if depth == 0 and self.sampler is not None and self.profile_slowest:
+                sampled = self.sampler.claim()
+        alloc = self.tracemalloc.get_traced_memory()[0] if self.tracemalloc else 0
+        return time.perf_counter(), current_rss(), alloc, call, sampled
+
+    def _stop(self, name, items, start):
+        seconds = time.perf_counter() - start[0]
+        rss_delta = current_rss() - start[1]
+        alloc_delta = self.tracemalloc.get_traced_memory()[0] - start[2] if self.tracemalloc else 0
+        self._metric(name).add(seconds, items, rss_delta, alloc_delta)
+        if start[3]:
+            self.local.depth -= 1
+        if start[4]:
+            samples = self.sampler.current[1]
+            self.num_profiled += 1
+            entry = (seconds, self.num_profiled, "{}-{}".format(name, self.num_profiled), samples)
+            if len(self.slowest) < self.profile_slowest:
+                heapq.heappush(self.slowest, entry)
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+            self.sampler.release() # only now can a call in another thread claim the sampler
+
+    def write_jsonl(self, path):
+        """ Write one JSON record per stage or function.
+
+        Args:
+            path (string): output file
+        """
+        with open(path, "w") as f:
+            for metric in self.metrics.values():
+                f.write(json.dumps(metric.to_dict()) + "\n")
+
+    def write_prometheus(self, path, prefix = "clickbait"):
+        """ Write the metrics in the Prometheus text exposition format, e.g. for node_exporter's
+        textfile collector.
+
+        Args:
+            path (string): output file
+            prefix (string): metric name prefix
+        """
+        series = [("calls_total", "counter", 'calls'), ("items_total", "counter", 'items'),
+                  ("seconds_total", "counter", 'seconds'), ("max_seconds", "gauge", 'max_seconds'),
+                  ("rss_delta_bytes", "gauge", 'rss_delta'), ("alloc_delta_bytes", "gauge", 'alloc_delta')]
+        with open(path, "w") as f:
+            for suffix, kind, attr in series:
+                f.write("# TYPE {}_stage_{} {}\n".format(prefix, suffix, kind))
+                for metric in self.metrics.values():
+                    label = metric.name.replace("\\", "\\\\").replace('"', '\\"')
+                    f.write('{}_stage_{}{{stage="{}"}} {}\n'.format(prefix, suffix, label, getattr(metric, attr)))
+
+    def write_stacks(self, directory):
+        """ Write the sampled stacks of the slowest calls, one collapsed-stack file per call,
+        named by rank and stage.
+
+        Args:
+            directory (string): output directory (created if it doesn't exist)
+
+        Returns:
+            list of strings: the files written, slowest first
+        """
+        os.makedirs(directory, exist_ok = True)
+        paths = []
+        for rank, (seconds, _, label, samples) in enumerate(sorted(self.slowest, reverse = True)):
+            path = os.path.join(directory, "{:03d}_{}.folded".format(rank, label))
+            with open(path, "w") as f:
+                for stack, count in samples.most_common():
+                    f.write("{} {}\n".format(stack, count))
+            paths.append(path)
+        return paths
+
+tracer = Tracer()
+
+class stage(object):
+    """ Context manager timing one pipeline stage.
+
+    Args:
+        name (string): stage name
+        items (int): number of items handled; can also be set on the returned record
+    """
+
+    def __init__(self, name, items = 0):
+        self.name = name
+        self.record = Record(items)
+        self.start = None
+
+    def __enter__(self):
+        if tracer.enabled:
+            self.start = tracer._start(call = False)
+        return self.record
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            tracer._stop(self.name, self.record.items, self.start)
+        return False
+
+def traced(name = None):
+    """ Decorator recording every call of a function as one item of a stage.
+
+    Args:
+        name (string): stage name (default module.function)
+    """
+    def decorate(fn):
+        label = name or "{}.{}".format(fn.__module__, fn.__qualname__)
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            start = tracer._start()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                tracer._stop(label, 1, start)
+        return wrapper
+    return decorate
+
+enable = tracer.enable
+disable = tracer.disable
+write_jsonl = tracer.write_jsonl
+write_prometheus = tracer.write_prometheus
+write_stacks = tracer.write_stacks
+
+def _write_at_exit(path, profile_slowest):
+    import multiprocessing
+    if multiprocessing.parent_process() is not None:
+        return # worker processes inherit the environment; only the main process writes
+    if path.endswith(".prom"):
+        tracer.write_prometheus(path)
+    else:
+        tracer.write_jsonl(path)
+    if profile_slowest:
+        tracer.write_stacks(path + ".stacks")
+
+if os.environ.get("CLICKBAIT_TRACE"):
+    _profile = int(os.environ.get("CLICKBAIT_PROFILE", "0"))
+    tracer.enable(profile_slowest = _profile)
+    atexit.register(_write_at_exit, os.environ["CLICKBAIT_TRACE"], _profile)
@@ -0,0 +1,140 @@
+""" Fast headline triage without a full spaCy parse.
+
+listicle, leadsWithQuestion, accusatory and superlative only need tokens, so for triaging
+incoming headlines they're computed from the tokenizer output alone, with rule-based
+sentence boundaries and a vector-vocabulary heuristic standing in for the lemmatizer.
+Features that need the parser or NER (hasDeterminer, numNamedEntities) fall back to a
+full parse. agreement_report measures how often the fast path matches the full parse.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from listicles import scan_listicle
+from dimensions import leads_with_question, is_you_form, irr_superlatives
+from features import extract
+
+sentence_final = frozenset([".", "!", "?", "...", "…"])
+tokenizer_features = ["listicle", "leadsWithQuestion", "accusatory", "superlative"]
+parse_features = ["hasDeterminer", "numNamedEntities"]
+
+def rule_sentences(doc):
+    """ Sentence boundaries from sentence-final punctuation alone.
+
+    Args:
+        doc (spacy.tokens.doc.Doc): a tokenized (not necessarily parsed) document
+
+    Returns:
+        list of tuples: (start, end) token offsets of each sentence
+    """
+    bounds = []
+    start = 0
+    for tok in doc:
+        if tok.text in sentence_final and tok.i + 1 < len(doc) and doc[tok.i + 1].text not in sentence_final:
+            bounds.append((start, tok.i + 1))
+            start = tok.i + 1
+    if start < len(doc):
+        bounds.append((start, len(doc)))
+    return bounds
+
+def rule_superlative(tok):
+    """ Approximates dimensions.is_superlative without a lemma. A regular "-est" form counts if
+    both its stem and the stem's "-er" form are in the vector vocabulary ("great", "greater"),
+    and the stem isn't itself missing a final "e" ("late" for "latest", lemmatized to "late").
+
+    Args:
+        tok (spacy.tokens.token.Token): a token from a document with a vector vocabulary
+
+    Returns:
+        bool: whether the token looks like a superlative
+    """
+    text = tok.text.lower()
+    if text in irr_superlatives:
+        return True
+    if len(text) > 5 and text.endswith("est"):
+        stem = text[:-3]
+        vocab = tok.vocab
+        return vocab.has_vector(stem) and vocab.has_vector(stem + "er") and not vocab.has_vector(stem + "e")
+    return False
+
+class Triage(object):
+    """ Computes headline features from the tokenizer output, parsing only when a feature needs it.
+
+    Args:
+        nlp (spacy.language.Language): model whose tokenizer and vocab are used; its vectors
+            drive the superlative heuristic
+        full_nlp (spacy.language.Language): model for features that need a parse (default nlp)
+    """
+
+    def __init__(self, nlp, full_nlp = None):
+        self.nlp = nlp
+        self.full_nlp = full_nlp or nlp
+        # without vectors there's nothing to base the superlative heuristic on
+        self.fast = [name for name in tokenizer_features if name != "superlative" or len(nlp.vocab.vectors)]
+
+    def features(self, doc):
+        """ Compute the tokenizer-only features of a tokenized headline.
+
+        Args:
+            doc (spacy.tokens.doc.Doc): a tokenized headline
+
+        Returns:
+            dict: feature name -> value
+        """
+        values = {}
+        if "listicle" in self.fast:
+            values["listicle"] = scan_listicle(doc, rule_sentences(doc))
+        if "leadsWithQuestion" in self.fast:
+            values["leadsWithQuestion"] = len(doc) > 0 and leads_with_question(doc)
+        if "accusatory" in self.fast:
+            values["accusatory"] = any(is_you_form(tok) for tok in doc)
+        if "superlative" in self.fast:
+            values["superlative"] = any(rule_superlative(tok) for tok in doc)
+        return values
+
+    def run(self, texts, names = None, batch_size = 1000):
+        """ Triage a batch of headlines.
+
+        Args:
+            texts (list of strings): headlines
+            names (list of strings): features to compute (default all tokenizer features)
+            batch_size (int): batch size for tokenizing and, if needed, parsing
+
+        Returns:
+            OrderedDict: feature name -> numpy array with one value per headline
+        """
+        names = names or tokenizer_features
+        fast = [name for name in names if name in self.fast]
+        slow = [name for name in names if name not in self.fast]
+        results = OrderedDict()
+        if fast:
+            rows = [self.features(doc) for doc in self.nlp.tokenizer.pipe(texts, batch_size = batch_size)]
+            for name in fast:
+                results[name] = np.array([row[name] for row in rows])
+        if slow:
+            results.update(extract(self.full_nlp.pipe(texts, batch_size = batch_size), slow))
+        return OrderedDict((name, results[name]) for name in names)
+
+def agreement_report(texts, triage, batch_size = 1000):
+    """ Compare the fast triage features with the same features computed from a full parse.
+
+    Args:
+        texts (list of strings): headlines
+        triage (Triage): the triage to evaluate
+        batch_size (int): batch size for tokenizing and parsing
+
+    Returns:
+        dict: feature name -> dict with the agreement rate and counts of false positives and
+            false negatives of the fast path, relative to the full parse
+    """
+    fast = triage.run(texts, triage.fast, batch_size)
+    full = extract(triage.full_nlp.pipe(texts, batch_size = batch_size), triage.fast)
+    report = {}
+    for name in triage.fast:
+        a, b = fast[name].astype(bool), full[name].astype(bool)
+        report[name] = {'n': len(a),
+                        'agreement': float(np.mean(a == b)) if len(a) else float('nan'),
+                        'false_positives': int(np.sum(a & ~b)),
+                        'false_negatives': int(np.sum(~a & b))}
+    return report
@@ -1,41 +1,139 @@
-import spacy
+import numpy as np
+from collections import namedtuple
 
-nlp = spacy.load('en_core_web_lg')
+from tracing import traced, stage
 
-import pandas as pd
-import pickle
+vadtup = namedtuple("vad", ['valence', 'arousal', 'dominance'])
 
-df = pickle.load(open("Data/clickbait.p", "rb"))
-docs = pickle.load(open("Data/title_docs.p", "rb"))
+pipeline_needs = {"lemma"} # annotations read, see parsing.Parser
 
-df = df.merge(docs, left_index = True, right_index = True)
+class VadLexicon(object):
+    """ The VAD lexicon compiled into a lemma -> row hash and a contiguous (N, 3) array of
+    valence, arousal and dominance scores.
 
-vad = pd.read_csv("Data/vad.csv", index_col = 1)
-vad = vad[['V.Mean.Sum', 'A.Mean.Sum', 'D.Mean.Sum']]
-vad = vad.rename(index = str, columns = {'V.Mean.Sum':'valence', 'A.Mean.Sum':'arousal', 'D.Mean.Sum':'dominance'})
+    Args:
+        words (list of strings): lexicon entries
+        scores (numpy.array): shape (len(words), 3); valence, arousal, dominance for each entry
+        dtype (numpy.dtype): storage type for the scores. float32 halves memory, but then the
+            averages no longer match the float64 values read from the csv exactly.
+    """
 
-import numpy as np
-from collections import namedtuple
+    def __init__(self, words, scores, dtype = np.float64):
+        self.index = {}
+        for row, word in enumerate(words):
+            self.index.setdefault(word, row) # keep the first entry for any repeated word
+        self.scores = np.ascontiguousarray(scores, dtype = dtype)
+        self.lemma_rows = {} # lemma hash -> row (or -1), so each lemma's string is looked up once
 
-vadtup = namedtuple("vad", ['valence', 'arousal', 'dominance'])
+    @classmethod
+    def from_csv(cls, path = "Data/vad.csv", dtype = np.float64):
+        """ Compile the lexicon from the VAD norms csv.
+
+        Args:
+            path (string): path to the csv
+            dtype (numpy.dtype): storage type for the scores
+
+        Returns:
+            VadLexicon: the compiled lexicon
+        """
+        import pandas as pd
+        vad = pd.read_csv(path, index_col = 1)
+        vad = vad[['V.Mean.Sum', 'A.Mean.Sum', 'D.Mean.Sum']]
+        return cls([str(word) for word in vad.index], vad.values, dtype)
+
+    def rows(self, doc):
+        """ Find the lexicon rows of a document's tokens, matching on lower-cased lemma.
+
+        Args:
+            doc (spacy.tokens.doc.Doc): a spaCy document
+
+        Returns:
+            numpy.array: lexicon row for each token found in the lexicon, in document order
+        """
+        from spacy.attrs import LEMMA
+        strings = doc.vocab.strings
+        rows = []
+        for lemma in doc.to_array([LEMMA]).ravel().tolist():
+            row = self.lemma_rows.get(lemma)
+            if row is None:
+                row = self.lemma_rows[lemma] = self.index.get(strings[lemma].lower(), -1)
+            if row >= 0:
+                rows.append(row)
+        return np.array(rows, dtype = np.int64)
 
-def get_vad(doc):
+    def score(self, docs):
+        """ Average valence, arousal and dominance for a batch of documents.
+
+        Args:
+            docs (iterable of spacy.tokens.doc.Doc): spaCy documents
+
+        Returns:
+            numpy.array: shape (# of docs, 3); mean valence, arousal and dominance of each document's
+                lexicon hits, or NaN for documents with no hits
+        """
+        doc_rows = [self.rows(doc) for doc in docs]
+        counts = np.array([len(rows) for rows in doc_rows], dtype = np.int64)
+        offsets = np.cumsum(counts) - counts
+        rows = np.concatenate(doc_rows) if doc_rows else np.zeros(0, dtype = np.int64)
+        hits = np.ascontiguousarray(self.scores[rows].T, dtype = np.float64) # shape (3, # of hits)
+        means = np.full((len(doc_rows), 3), np.nan)
+        # reduce all documents with the same number of hits together, as rows of one (3, docs, hits) block;
+        # summing each contiguous row with np.add.reduce gives exactly the values np.mean would
+        for count in np.unique(counts[counts > 0]):
+            same = np.flatnonzero(counts == count)
+            block = np.ascontiguousarray(hits[:, offsets[same, None] + np.arange(count)])
+            means[same] = (np.add.reduce(block, axis = 2) / count).T
+        return means
+
+default_lexicon = None
+
+@traced("get_vad")
+def get_vad(doc, lexicon = None):
     """ Returns the valence, arousal, and dominance scores for a document.
+    Uses the lexicon in Data/vad.csv unless another VadLexicon is given.
     """
-    scores = [vadtup(vad.loc[tok.lemma_.lower()]['valence'], vad.loc[tok.lemma_.lower()]['arousal'], vad.loc[tok.lemma_.lower()]['dominance']) 
-              for tok in doc if tok.lemma_.lower() in vad.index]
-    
-    avg_val = np.mean([tup.valence for tup in scores])
-    avg_arous = np.mean([tup.arousal for tup in scores])
-    avg_dom = np.mean([tup.dominance for tup in scores])
-    
-    return vadtup(avg_val, avg_arous, avg_dom)
-
-vads = [get_vad(title) for title in df['titleDoc']]
-
-df['valence'] = [v.valence for v in vads]
-df['arousal'] = [v.arousal for v in vads]
-df['dominance'] = [v.dominance for v in vads]
-
-results = df[['valence', 'arousal', 'dominance']].copy()
-results.to_csv("Results/vad_measures.csv")
\ No newline at end of file
+    global default_lexicon
+    if lexicon is None:
+        if default_lexicon is None:
+            default_lexicon = VadLexicon.from_csv()
+        lexicon = default_lexicon
+    return vadtup(*lexicon.score([doc])[0])
+
+def main():
+    from loader import read_corpus
+    from doc_cache import DocCache
+    from parsing import Parser
+
+    # only lemmas are read, so the tagger, attribute ruler and lemmatizer are all that run
+    nlp = Parser('en_core_web_lg', pipeline_needs)
+
+    with stage("vad.load") as s:
+        df = read_corpus("Data/clickbait.parquet")
+        s.items = len(df)
+    with stage("vad.parse", items = len(df)):
+        # kept apart from the fully parsed titles the other stages read by corpus id
+        titles = DocCache("Data/doc_cache/titles_lemma", nlp)
+        titles.parse(zip(df.index, df['targetTitle'])) # only parses titles not already in the cache
+        df['titleDoc'] = titles.get_many(df.index)
+
+    with stage("vad.score", items = len(df)):
+        vads = VadLexicon.from_csv("Data/vad.csv").score(df['titleDoc'])
+
+    df['valence'] = vads[:, 0]
+    df['arousal'] = vads[:, 1]
+    df['dominance'] = vads[:, 2]
+
+    results = df[['valence', 'arousal', 'dominance']].copy()
+    results.to_csv("Results/vad_measures.csv")
+    # with the labels, for folding into saved statistics later, see stats.main
+    df[['valence', 'arousal', 'dominance', 'truthMean', 'truthMedian', 'truthClass']].to_parquet("Results/vad_features.parquet")
+
+    # per-class means and correlations with the truth labels, without the merge in vad_analysis.R
+    from stats import RunningStats
+    with stage("vad.stats", items = len(df)):
+        summary = RunningStats(['valence', 'arousal', 'dominance']).update(df)
+        summary.means().to_csv("Results/vad_means.csv")
+        summary.correlations().to_csv("Results/vad_correlations.csv", index = False)
+
+if __name__ == "__main__":
+    main()
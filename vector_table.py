@@ -0,0 +1,118 @@
+""" Word vectors as a memory-mapped table shared by all worker processes.
+
+export_vectors writes a model's vector table once to .npy files: the vector keys (orth hashes)
+sorted, the row each key maps to, and the float32 vectors. VectorTable memory-maps them, so any
+number of processes on the machine read the same pages from the OS page cache instead of each
+loading its own copy of the model's vectors, and looks keys up with a binary search.
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+
+def export_vectors(vocab, path, chunk_rows = 65536):
+    """ Write a vocab's vectors to a directory readable by VectorTable.
+
+    Args:
+        vocab (spacy.vocab.Vocab): vocab of a model with vectors, e.g. en_core_web_lg
+        path (string): directory to write keys.npy, rows.npy and vectors.npy to
+        chunk_rows (int): number of vectors copied at a time, to bound memory while exporting
+    """
+    vectors = vocab.vectors
+    key2row = vectors.key2row
+    keys = np.fromiter(key2row.keys(), dtype = np.uint64, count = len(key2row))
+    rows = np.fromiter(key2row.values(), dtype = np.int64, count = len(key2row))
+    order = np.argsort(keys)
+    os.makedirs(path, exist_ok = True)
+    np.save(os.path.join(path, "keys.npy"), keys[order])
+    np.save(os.path.join(path, "rows.npy"), rows[order].astype(np.int32))
+    data = vectors.data
+    out = np.lib.format.open_memmap(os.path.join(path, "vectors.npy"), mode = "w+", dtype = np.float32, shape = data.shape)
+    for start in range(0, data.shape[0], chunk_rows):
+        out[start:start + chunk_rows] = np.asarray(data[start:start + chunk_rows], dtype = np.float32)
+    out.flush()
+    del out
+
+class VectorTable(object):
+    """ Read-only, memory-mapped view of an exported vector table.
+
+    Args:
+        path (string): directory written by export_vectors
+    """
+
+    def __init__(self, path):
+        self.keys = np.load(os.path.join(path, "keys.npy"), mmap_mode = 'r')
+        self.rows = np.load(os.path.join(path, "rows.npy"), mmap_mode = 'r')
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode = 'r')
+        self.width = self.vectors.shape[1]
+
+    def lookup(self, keys):
+        """ Find the table rows of a batch of keys.
+
+        Args:
+            keys (numpy.array): orth hashes, e.g. from doc.to_array(ORTH)
+
+        Returns:
+            numpy.array: row of each key, or -1 for keys without a vector
+        """
+        keys = np.asarray(keys, dtype = np.uint64)
+        if not len(self.keys):
+            return np.full(len(keys), -1, dtype = np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[pos] == keys
+        return np.where(found, self.rows[pos], -1).astype(np.int64)
+
+    def span_vectors(self, keys, bounds):
+        """ Average the vectors of the tokens in each span, as spaCy's Span.vector does (tokens
+        without a vector count as zeros), and scale each average to unit length.
+
+        Args:
+            keys (numpy.array): orth hash of every token in the document
+            bounds (list of tuples): (start, end) token offsets of each span
+
+        Returns:
+            numpy.array: shape (# of spans, width), float32; all-zero rows for spans with no vectors
+        """
+        out = np.zeros((len(bounds), self.width), dtype = np.float32)
+        if not len(bounds):
+            return out
+        starts = np.array([start for start, _ in bounds], dtype = np.int64)
+        lengths = np.array([end - start for start, end in bounds], dtype = np.int64)
+        offsets = np.cumsum(lengths) - lengths
+        tokens = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum()) # token positions, span by span
+        rows = self.lookup(np.asarray(keys, dtype = np.uint64)[tokens])
+        found = rows >= 0
+        if found.any():
+            # one gather of the distinct rows the spans need, in table order, then a segment sum per span
+            unique_rows, inverse = np.unique(rows[found], return_inverse = True)
+            token_vectors = np.zeros((len(rows), self.width), dtype = np.float32)
+            token_vectors[found] = self.vectors[unique_rows][inverse.ravel()]
+            out = np.add.reduceat(token_vectors, offsets, axis = 0) / lengths[:, None]
+        norms = np.linalg.norm(out, axis = 1)
+        return (out / np.where(norms > 0, norms, 1.)[:, None]).astype(np.float32)
+
+@lru_cache(maxsize = None)
+def load_table(path):
+    """ Open an exported vector table once per process.
+
+    Args:
+        path (string): directory written by export_vectors
+
+    Returns:
+        VectorTable: the table
+    """
+    return VectorTable(path)
+
+def main():
+    import argparse
+    from parsing import load_model
+
+    parser = argparse.ArgumentParser(description = "Export a model's word vectors for memory-mapped use.")
+    parser.add_argument("--model", default = "en_core_web_lg")
+    parser.add_argument("--out", default = "Data/vectors")
+    args = parser.parse_args()
+    export_vectors(load_model(args.model).vocab, args.out)
+
+if __name__ == "__main__":
+    main()